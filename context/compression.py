@@ -26,6 +26,9 @@ class ContextCompressor:
         """
         Comprimir lista de mensajes manteniendo información importante
         
+        Los mensajes antiguos se agrupan por categoría localmente y se resumen
+        con una única llamada al LLM, independientemente de cuántos sean.
+        
         Args:
             messages: Lista de mensajes a comprimir
             target_reduction: Porcentaje objetivo de reducción (0.5 = 50%)
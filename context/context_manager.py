@@ -15,6 +15,7 @@ class ContextManager:
         self.settings = settings
         self.messages: List[Dict[str, Any]] = []
         self.current_tokens = 0
+        self._total_chars = 0  # Suma de caracteres de self.messages
         self.session_start = time.time()
         
         # Sistema de memoria persistente
@@ -33,7 +34,7 @@ class ContextManager:
         }
         
         self.messages.append(message)
-        self._update_token_count()
+        self._add_to_token_count(content)
         self._check_compression_needed()
         
         # Guardar en memoria persistente
@@ -52,7 +53,7 @@ class ContextManager:
         }
         
         self.messages.append(message)
-        self._update_token_count()
+        self._add_to_token_count(content)
         self._check_compression_needed()
         
         # Guardar en memoria persistente
@@ -84,15 +85,23 @@ class ContextManager:
     def _update_token_count(self):
         """Actualizar conteo de tokens (aproximado)"""
         # Estimación simple: ~4 caracteres por token
-        total_chars = sum(len(msg['content']) for msg in self.messages)
-        self.current_tokens = total_chars // 4
+        self._total_chars = sum(len(msg['content']) for msg in self.messages)
+        self.current_tokens = self._total_chars // 4
+    
+    def _add_to_token_count(self, content: str):
+        """Sumar un mensaje nuevo al conteo sin recorrer todo el contexto"""
+        self._total_chars += len(content)
+        self.current_tokens = self._total_chars // 4
     
     def _check_compression_needed(self):
         """Verificar si se necesita comprimir el contexto"""
         max_tokens = self.settings.context['max_tokens']
         threshold = self.settings.context['compression_threshold']
         
-        if self.current_tokens > (max_tokens * threshold):
+        # Los mensajes ya están archivados en memory_store, así que la ventana
+        # en memoria se acota tanto por tokens como por número de mensajes
+        if (self.current_tokens > (max_tokens * threshold) or
+                len(self.messages) > self.settings.context['memory_limit']):
             self._compress_context()
     
     def _compress_context(self):
@@ -127,9 +136,10 @@ class ContextManager:
             print("🗜️ Contexto comprimido automáticamente")
     
     def _create_summary(self, messages: List[Dict[str, Any]]) -> str:
-        """Crear resumen de mensajes antiguos"""
+        """Crear resumen de mensajes antiguos (incluye resúmenes previos)"""
         # Resumen básico - podría mejorarse con LLM
         summary_parts = []
+        summary_prefix = "Resumen de conversación anterior: "
         
         user_messages = [msg for msg in messages if msg['role'] == 'user']
         assistant_messages = [msg for msg in messages if msg['role'] == 'assistant']
@@ -140,12 +150,22 @@ class ContextManager:
         if assistant_messages:
             summary_parts.append(f"Se discutieron temas de: programación, análisis de código, y desarrollo")
         
-        return ". ".join(summary_parts)
+        # Resumen recursivo: conservar lo resumido en compresiones anteriores
+        for msg in messages:
+            if msg['role'] == 'system' and msg['content'].startswith(summary_prefix):
+                summary_parts.append(msg['content'][len(summary_prefix):])
+        
+        return ". ".join(summary_parts)[:self.settings.context['summary_length']]
+    
+    def recall_memory_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Recuperar mensajes de la sesión actual que ya salieron del contexto"""
+        return self.memory_store.search_messages(query, session_id=self.session_id, limit=limit)
     
     def clear_context(self):
         """Limpiar contexto completamente"""
         self.messages = []
         self.current_tokens = 0
+        self._total_chars = 0
         self._save_context()
     
     def get_context_summary(self) -> str:
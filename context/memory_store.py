@@ -5,7 +5,9 @@ Sistema de memoria persistente para LocalClaude
 import sqlite3
 import json
 import time
+import queue
 import hashlib
+import threading
 from pathlib import Path
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
@@ -18,6 +20,11 @@ class MemoryStore:
         self.db_path = settings.files['memory_db']
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
+        # Escritura diferida de uso de comandos (fuera del hilo interactivo)
+        self._command_queue: queue.Queue = queue.Queue()
+        self._command_writer: Optional[threading.Thread] = None
+        self._command_writer_lock = threading.Lock()
+        
         # Inicializar base de datos
         self._init_database()
     
@@ -176,7 +183,7 @@ class MemoryStore:
                 SELECT role, content, timestamp, model_used, tokens_used, metadata
                 FROM conversations 
                 WHERE session_id = ?
-                ORDER BY timestamp ASC
+                ORDER BY timestamp ASC, id ASC
             ''', (session_id,))
             
             messages = []
@@ -196,6 +203,41 @@ class MemoryStore:
             
             return messages
     
+    def search_messages(self, query: str, session_id: str = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Buscar mensajes archivados que contengan el texto (más recientes primero)"""
+        # Escapar comodines de LIKE para buscar el texto literal
+        escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        pattern = f"%{escaped}%"
+        
+        with sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            
+            if session_id:
+                cursor = conn.execute('''
+                    SELECT role, content, timestamp
+                    FROM conversations 
+                    WHERE session_id = ? AND content LIKE ? ESCAPE '\\'
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ?
+                ''', (session_id, pattern, limit))
+            else:
+                cursor = conn.execute('''
+                    SELECT role, content, timestamp
+                    FROM conversations 
+                    WHERE content LIKE ? ESCAPE '\\'
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ?
+                ''', (pattern, limit))
+            
+            return [
+                {
+                    'role': row['role'],
+                    'content': row['content'],
+                    'timestamp': row['timestamp']
+                }
+                for row in cursor.fetchall()
+            ]
+    
     def get_recent_sessions(self, workspace_path: str = None, limit: int = 10) -> List[Dict[str, Any]]:
         """Obtener sesiones recientes"""
         with sqlite3.connect(self.db_path) as conn:
@@ -207,7 +249,7 @@ class MemoryStore:
                            total_messages, summary
                     FROM sessions 
                     WHERE workspace_path = ?
-                    ORDER BY start_time DESC
+                    ORDER BY start_time DESC, id DESC
                     LIMIT ?
                 ''', (workspace_path, limit))
             else:
@@ -215,7 +257,7 @@ class MemoryStore:
                     SELECT session_id, workspace_path, start_time, end_time, 
                            total_messages, summary
                     FROM sessions 
-                    ORDER BY start_time DESC
+                    ORDER BY start_time DESC, id DESC
                     LIMIT ?
                 ''', (limit,))
             
@@ -277,7 +319,7 @@ class MemoryStore:
                 SELECT project_path, project_name, project_type, last_accessed,
                        files_count, languages, description
                 FROM projects 
-                ORDER BY last_accessed DESC
+                ORDER BY last_accessed DESC, id DESC
                 LIMIT ?
             ''', (limit,))
             
@@ -327,7 +369,7 @@ class MemoryStore:
                     SELECT project_path, file_path, action, timestamp, session_id, details
                     FROM files_history 
                     WHERE file_path = ?
-                    ORDER BY timestamp DESC
+                    ORDER BY timestamp DESC, id DESC
                     LIMIT ?
                 ''', (file_path, limit))
             elif project_path:
@@ -335,14 +377,14 @@ class MemoryStore:
                     SELECT project_path, file_path, action, timestamp, session_id, details
                     FROM files_history 
                     WHERE project_path = ?
-                    ORDER BY timestamp DESC
+                    ORDER BY timestamp DESC, id DESC
                     LIMIT ?
                 ''', (project_path, limit))
             else:
                 cursor = conn.execute('''
                     SELECT project_path, file_path, action, timestamp, session_id, details
                     FROM files_history 
-                    ORDER BY timestamp DESC
+                    ORDER BY timestamp DESC, id DESC
                     LIMIT ?
                 ''', (limit,))
             
@@ -366,26 +408,86 @@ class MemoryStore:
     def record_command_usage(self, command: str, session_id: str = None):
         """Registrar uso de comando"""
         with sqlite3.connect(self.db_path) as conn:
-            # Verificar si el comando ya existe
-            cursor = conn.execute('''
-                SELECT usage_count FROM command_usage WHERE command = ?
-            ''', (command,))
-            
-            existing = cursor.fetchone()
-            
-            if existing:
-                # Incrementar contador
-                conn.execute('''
-                    UPDATE command_usage 
-                    SET usage_count = usage_count + 1, last_used = ?, session_id = ?
-                    WHERE command = ?
-                ''', (time.time(), session_id, command))
-            else:
-                # Crear nuevo registro
-                conn.execute('''
-                    INSERT INTO command_usage (command, last_used, session_id)
-                    VALUES (?, ?, ?)
-                ''', (command, time.time(), session_id))
+            self._upsert_command_usage(conn, command, session_id, time.time())
+    
+    def async_record_command_usage(self, command: str, session_id: str = None):
+        """
+        Registrar uso de comando sin bloquear al llamador
+        
+        El registro se encola y un hilo escritor lo persiste en lotes
+        (cada 50 ms o 64 registros). Usar flush_command_usage() antes de salir.
+        """
+        self._ensure_command_writer()
+        self._command_queue.put((command, session_id, time.time()))
+    
+    def flush_command_usage(self):
+        """Esperar a que se persistan todos los usos de comando encolados"""
+        if self._command_writer is not None:
+            self._command_queue.join()
+    
+    def _ensure_command_writer(self):
+        """Arrancar el hilo escritor en el primer uso"""
+        if self._command_writer is not None:
+            return
+        
+        with self._command_writer_lock:
+            if self._command_writer is None:
+                self._command_writer = threading.Thread(
+                    target=self._command_writer_loop,
+                    name='memory-store-commands',
+                    daemon=True
+                )
+                self._command_writer.start()
+    
+    def _command_writer_loop(self, max_batch: int = 64, max_wait: float = 0.05):
+        """Bucle del hilo escritor: agrupar registros y escribirlos en una transacción"""
+        while True:
+            batch = [self._command_queue.get()]
+            deadline = time.monotonic() + max_wait
+            
+            while len(batch) < max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._command_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                with sqlite3.connect(self.db_path) as conn:
+                    for command, session_id, timestamp in batch:
+                        self._upsert_command_usage(conn, command, session_id, timestamp)
+            except sqlite3.Error:
+                # Fallo silencioso: el uso de comandos es informativo
+                pass
+            finally:
+                for _ in batch:
+                    self._command_queue.task_done()
+    
+    def _upsert_command_usage(self, conn: sqlite3.Connection, command: str,
+                              session_id: Optional[str], timestamp: float):
+        """Incrementar o crear el registro de uso de un comando"""
+        # Verificar si el comando ya existe
+        cursor = conn.execute('''
+            SELECT usage_count FROM command_usage WHERE command = ?
+        ''', (command,))
+        
+        existing = cursor.fetchone()
+        
+        if existing:
+            # Incrementar contador
+            conn.execute('''
+                UPDATE command_usage 
+                SET usage_count = usage_count + 1, last_used = ?, session_id = ?
+                WHERE command = ?
+            ''', (timestamp, session_id, command))
+        else:
+            # Crear nuevo registro
+            conn.execute('''
+                INSERT INTO command_usage (command, last_used, session_id)
+                VALUES (?, ?, ?)
+            ''', (command, timestamp, session_id))
     
     def get_popular_commands(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Obtener comandos más utilizados"""
@@ -394,7 +496,7 @@ class MemoryStore:
             cursor = conn.execute('''
                 SELECT command, usage_count, last_used
                 FROM command_usage 
-                ORDER BY usage_count DESC, last_used DESC
+                ORDER BY usage_count DESC, last_used DESC, id ASC
                 LIMIT ?
             ''', (limit,))
             
@@ -516,7 +618,7 @@ class MemoryStore:
             # Comando más usado
             cursor = conn.execute('''
                 SELECT command, usage_count FROM command_usage 
-                ORDER BY usage_count DESC LIMIT 1
+                ORDER BY usage_count DESC, last_used DESC, id ASC LIMIT 1
             ''')
             result = cursor.fetchone()
             if result:
@@ -4,12 +4,13 @@ Motor principal de la CLI LocalClaude
 
 import sys
 import os
+import re
 import time
 from typing import Optional, Dict, Any
 from pathlib import Path
 
 from core.ollama_interface import OllamaInterface
-from core.command_processor import CommandProcessor
+from core.command_processor import CommandProcessor, safe
 from context.context_manager import ContextManager
 from context.compression import ContextCompressor
 from workspace.explorer import WorkspaceExplorer
@@ -23,15 +24,47 @@ from monitoring.metrics import get_metrics_collector
 from core.nlp_parser import NLPParser
 from core.conversation_engine import ConversationEngine
 from core.intent_router import IntentRouter
-from core.response_generator import ResponseGenerator
+from core.response_generator import ResponseGenerator, CONFIDENCE_LOW
+
+
+# Palabras clave de _analyze_task_type
+_SIMPLE_KW = frozenset({'estado', 'status', 'qué', 'cómo'})
+_CODE_KW = frozenset({'código', 'programar', 'función', 'clase'})
+
+
+def _keyword_regex(keywords: frozenset) -> re.Pattern:
+    """Compilar un conjunto de palabras clave como una sola alternancia"""
+    return re.compile('|'.join(re.escape(word) for word in sorted(keywords)), re.IGNORECASE)
+
+
+# Compiladas una vez: un solo recorrido del texto en C por categoría, sin
+# pasar a minúsculas. Se busca por subcadena ("¿cómo", "clases"), no por token
+_SIMPLE_TASK_RE = _keyword_regex(_SIMPLE_KW)
+_CODE_TASK_RE = _keyword_regex(_CODE_KW)
+
 
 class CLIEngine:
     """Motor principal de la CLI"""
     
+    __slots__ = (
+        'settings', 'running', 'metrics',
+        'ollama', 'context_manager', 'compressor',
+        'workspace_explorer', 'file_manager', 'code_analyzer',
+        'command_processor', 'ui',
+        'nlp_parser', 'conversation_engine', 'intent_router', 'response_generator',
+        '_cmd_prefix', '_cmd_prefix_len', '_debug', '_workspace_path'
+    )
+    
     def __init__(self, settings: Settings):
         self.settings = settings
         self.running = False
         
+        # Snapshot de configuración leída en cada turno
+        self._cmd_prefix = settings.cli['command_prefix']
+        self._cmd_prefix_len = len(self._cmd_prefix)
+        self._debug = settings.cli['debug']
+        self._workspace_path: Path = Path(settings.workspace_dir).resolve()
+        
         # Inicializar métricas
         self.metrics = get_metrics_collector()
         
@@ -72,16 +105,16 @@ class CLIEngine:
         
         # Iniciar sesión conversacional
         session_id = self.conversation_engine.start_conversation()
-        self.ui.show_debug(f"Sesión conversacional iniciada: {session_id}")
+        self.ui.show_debug(lambda: f"Sesión conversacional iniciada: {session_id}")
     
     def _setup_command_processor(self):
         """Configurar el procesador de comandos"""
         # Registrar comandos del sistema
-        self.command_processor.register_command('help', self._cmd_help)
-        self.command_processor.register_command('exit', self._cmd_exit)
-        self.command_processor.register_command('quit', self._cmd_exit)
+        self.command_processor.register_command('help', self._cmd_help, fast=True)
+        self.command_processor.register_command('exit', self._cmd_exit, fast=True)
+        self.command_processor.register_command('quit', self._cmd_exit, fast=True)
         self.command_processor.register_command('status', self._cmd_status)
-        self.command_processor.register_command('context', self._cmd_context)
+        self.command_processor.register_command('context', self._cmd_context, fast=True)
         self.command_processor.register_command('clear', self._cmd_clear)
         self.command_processor.register_command('model', self._cmd_model)
         self.command_processor.register_command('metrics', self._cmd_metrics)
@@ -133,10 +166,14 @@ class CLIEngine:
             self.ui.show_error("No se pudo conectar con Ollama. Verifica que esté corriendo.")
             return
         
+        # Cargar el modelo mientras el usuario escribe su primera entrada
+        self.ollama.warm_model()
+        
         # Bucle principal
         while self.running:
             try:
                 # Mostrar prompt
+                self.ui.flush_before_prompt()
                 user_input = self.ui.get_user_input()
                 
                 if not user_input.strip():
@@ -147,10 +184,11 @@ class CLIEngine:
                 
             except KeyboardInterrupt:
                 self.ui.show_message("\n👋 ¡Hasta luego!")
+                self.context_manager.memory_store.flush_command_usage()
                 break
             except Exception as e:
                 self.ui.show_error(f"Error inesperado: {e}")
-                if self.settings.cli['debug']:
+                if self._debug:
                     import traceback
                     traceback.print_exc()
     
@@ -160,23 +198,27 @@ class CLIEngine:
         
         try:
             # Verificar si es un comando especial
-            if user_input.startswith(self.settings.cli['command_prefix']):
+            if user_input.startswith(self._cmd_prefix):
                 # Es un comando especial
-                command_name = user_input[1:].split()[0] if len(user_input) > 1 else ''
+                command_name = user_input[self._cmd_prefix_len:].split(None, 1)[0] if len(user_input) > self._cmd_prefix_len else ''
                 command_result = self.command_processor.process_command(user_input)
                 
-                # Calcular tiempo de ejecución
-                execution_time = time.time() - start_time
-                
-                # Registrar métricas
-                self.metrics.log_command(command_name, execution_time, success=True)
+                if self.command_processor.is_fast(command_name):
+                    # Comando trivial: solo contarlo
+                    self.metrics.count_command(command_name)
+                else:
+                    # Calcular tiempo de ejecución
+                    execution_time = time.time() - start_time
+                    
+                    # Registrar métricas
+                    self.metrics.log_command(command_name, execution_time, success=True)
                 
                 if command_result:
                     self.ui.show_message(command_result)
                     
                     # Registrar uso del comando (legacy)
                     if command_name:
-                        self.context_manager.memory_store.record_command_usage(
+                        self.context_manager.memory_store.async_record_command_usage(
                             command_name, self.context_manager.session_id
                         )
             else:
@@ -186,7 +228,7 @@ class CLIEngine:
         except Exception as e:
             # Registrar error
             execution_time = time.time() - start_time
-            command_name = user_input[1:].split()[0] if user_input.startswith(self.settings.cli['command_prefix']) else 'conversation'
+            command_name = user_input[self._cmd_prefix_len:].split(None, 1)[0] if user_input.startswith(self._cmd_prefix) else 'conversation'
             
             self.metrics.log_command(command_name, execution_time, success=False)
             self.metrics.log_error('command_execution', str(e), {'input': user_input})
@@ -203,12 +245,19 @@ class CLIEngine:
             parsed_intent = self.nlp_parser.parse(user_input)
             
             # Log del intent detectado
-            if self.settings.cli['debug']:
+            if self._debug:
                 self.ui.show_debug(f"Intent detectado: {parsed_intent.intent.value} (confianza: {parsed_intent.confidence:.2f})")
             
             # 2. Router intención a través del Intent Router
             self.ui.show_thinking()
-            route_result = self.intent_router.route_intent(user_input, parsed_intent)
+            self.ui.begin_stream()
+            try:
+                route_result = self.intent_router.route_intent(
+                    user_input, parsed_intent, stream_callback=self.ui.write_token
+                )
+            finally:
+                # Cerrar siempre el stream: lo siguiente empieza en línea nueva
+                streamed = self.ui.end_stream()
             
             # 3. Generar respuesta formateada con Response Generator
             conversation_context = self.conversation_engine.get_context_for_llm()
@@ -219,17 +268,23 @@ class CLIEngine:
                 conversation_context
             )
             
-            # 4. Mostrar respuesta al usuario
-            self.ui.show_response(formatted_result["presentation"])
+            # 4. Mostrar respuesta al usuario (si ya se transmitió completa, solo
+            # lo añadido; si falló a medias, la presentación completa con el error)
+            if streamed and route_result["success"]:
+                extras = formatted_result["presentation"][len(formatted_result["formatted_response"]):]
+                if extras.strip():
+                    self.ui.show_message(extras.strip('\n'))
+            else:
+                self.ui.show_response(formatted_result["presentation"])
             
             # 5. Métricas y logging
             execution_time = time.time() - start_time
             self.metrics.log_command('conversation', execution_time, success=route_result["success"])
             
             # Log adicional para debugging
-            if self.settings.cli['debug']:
+            if self._debug:
                 self.ui.show_debug(f"Manejado por: {route_result['handled_by']} | Tiempo: {execution_time:.2f}s")
-                if formatted_result["metadata"].confidence_level == "low":
+                if formatted_result["metadata"].confidence_level == CONFIDENCE_LOW:
                     self.ui.show_debug("⚠️ Respuesta de baja confianza")
             
             # 6. Agregar al contexto legacy si es necesario
@@ -250,7 +305,7 @@ class CLIEngine:
             self.metrics.log_command('conversation', execution_time, success=False)
             self.metrics.log_error('conversation_error', str(e), {'input': user_input})
             
-            if self.settings.cli['debug']:
+            if self._debug:
                 import traceback
                 traceback.print_exc()
     
@@ -266,20 +321,19 @@ class CLIEngine:
     
     def _analyze_task_type(self, user_input: str) -> str:
         """Analizar tipo de tarea del usuario"""
-        user_input_lower = user_input.lower()
-        
         # Tareas simples
-        if any(word in user_input_lower for word in ['estado', 'status', 'qué', 'cómo']):
+        if _SIMPLE_TASK_RE.search(user_input):
             return 'simple_question'
         
         # Tareas de código
-        if any(word in user_input_lower for word in ['código', 'programar', 'función', 'clase']):
+        if _CODE_TASK_RE.search(user_input):
             return 'coding'
         
         # Por defecto, tarea compleja
         return 'complex'
     
     # Comandos del sistema
+    @safe
     def _cmd_help(self, args: list) -> str:
         """Mostrar ayuda"""
         return self.ui.get_help_text()
@@ -287,6 +341,7 @@ class CLIEngine:
     def _cmd_exit(self, args: list) -> str:
         """Salir de la CLI"""
         self.running = False
+        self.context_manager.memory_store.flush_command_usage()
         return "👋 ¡Hasta luego!"
     
     def _cmd_status(self, args: list) -> str:
@@ -298,11 +353,10 @@ class CLIEngine:
             'conexion_ollama': 'OK' if self.ollama.test_connection() else 'ERROR'
         }
         
-        result = "📊 Estado del sistema:\n"
-        for key, value in status.items():
-            result += f"  • {key}: {value}\n"
+        parts = ["📊 Estado del sistema:\n"]
+        parts.extend(f"  • {key}: {value}\n" for key, value in status.items())
         
-        return result
+        return "".join(parts)
     
     def _cmd_context(self, args: list) -> str:
         """Mostrar información del contexto"""
@@ -330,30 +384,30 @@ class CLIEngine:
         try:
             summary = self.metrics.get_session_summary()
             
-            result = "📊 **Métricas de Sesión Actual**\n\n"
-            
             # Información general
             duration_mins = summary['session_duration'] / 60
-            result += f"⏱️  **Duración**: {duration_mins:.1f} minutos\n"
-            result += f"🔢 **Comandos ejecutados**: {summary['commands_executed']}\n"
-            result += f"⚡ **Tiempo promedio**: {summary['avg_response_time']:.3f}s\n"
-            result += f"❌ **Errores**: {summary['errors_count']}\n\n"
-            
-            # Cache performance
-            result += f"💾 **Cache Hit Rate**: {summary['cache_hit_rate']:.1f}%\n\n"
+            parts = [
+                "📊 **Métricas de Sesión Actual**\n\n",
+                f"⏱️  **Duración**: {duration_mins:.1f} minutos\n",
+                f"🔢 **Comandos ejecutados**: {summary['commands_executed']}\n",
+                f"⚡ **Tiempo promedio**: {summary['avg_response_time']:.3f}s\n",
+                f"❌ **Errores**: {summary['errors_count']}\n\n",
+                # Cache performance
+                f"💾 **Cache Hit Rate**: {summary['cache_hit_rate']:.1f}%\n\n"
+            ]
             
             # Modelos utilizados
             if summary['models_used']:
-                result += "🤖 **Modelos utilizados**:\n"
-                for model, count in summary['models_used'].items():
-                    result += f"  • {model}: {count} veces\n"
+                parts.append("🤖 **Modelos utilizados**:\n")
+                parts.extend(f"  • {model}: {count} veces\n" for model, count in summary['models_used'].items())
             else:
-                result += "🤖 **Modelos**: Ninguno usado aún\n"
+                parts.append("🤖 **Modelos**: Ninguno usado aún\n")
             
             # Guardar estado actual
+            self.metrics.flush()
             self.metrics.save_current_state()
             
-            return result
+            return "".join(parts)
             
         except Exception as e:
             return f"❌ Error obteniendo métricas: {e}"
@@ -365,43 +419,42 @@ class CLIEngine:
             context = self.conversation_engine.get_context_for_llm()
             session_summary = self.conversation_engine.get_session_summary()
             
-            result = "💬 **Estado del Sistema Conversacional**\n\n"
+            parts = ["💬 **Estado del Sistema Conversacional**\n\n"]
             
             if self.conversation_engine.current_context:
                 # Información de sesión
-                result += f"🆔 **Sesión**: {session_summary.get('session_id', 'N/A')}\n"
-                result += f"⏱️  **Duración**: {session_summary.get('duration_minutes', 0):.1f} minutos\n"
-                result += f"🔢 **Turnos**: {session_summary.get('total_turns', 0)} ({session_summary.get('successful_turns', 0)} exitosos)\n"
-                result += f"✅ **Tasa de éxito**: {session_summary.get('success_rate', 0):.1%}\n\n"
+                parts.append(f"🆔 **Sesión**: {session_summary.get('session_id', 'N/A')}\n")
+                parts.append(f"⏱️  **Duración**: {session_summary.get('duration_minutes', 0):.1f} minutos\n")
+                parts.append(f"🔢 **Turnos**: {session_summary.get('total_turns', 0)} ({session_summary.get('successful_turns', 0)} exitosos)\n")
+                parts.append(f"✅ **Tasa de éxito**: {session_summary.get('success_rate', 0):.1%}\n\n")
                 
                 # Contexto actual
-                result += "🎯 **Contexto Actual**:\n"
-                result += f"  • **Tarea**: {context.get('current_task', 'Ninguna')}\n"
-                result += f"  • **Target**: {context.get('current_target', 'Ninguno')}\n"
+                parts.append("🎯 **Contexto Actual**:\n")
+                parts.append(f"  • **Tarea**: {context.get('current_task', 'Ninguna')}\n")
+                parts.append(f"  • **Target**: {context.get('current_target', 'Ninguno')}\n")
                 
                 recent_actions = context.get('recent_actions', [])
                 if recent_actions:
-                    result += f"  • **Acciones recientes**: {', '.join(recent_actions[-3:])}\n"
+                    parts.append(f"  • **Acciones recientes**: {', '.join(recent_actions[-3:])}\n")
                 
                 # Patrones del usuario
                 patterns = context.get('user_patterns', {})
                 if patterns.get('most_common_intent'):
-                    result += f"  • **Intent frecuente**: {patterns['most_common_intent']}\n"
+                    parts.append(f"  • **Intent frecuente**: {patterns['most_common_intent']}\n")
                 
                 # Sugerencias
                 suggestions = context.get('suggested_continuations', [])
                 if suggestions:
-                    result += "\n💡 **Sugerencias**:\n"
-                    for suggestion in suggestions[:2]:
-                        result += f"  • {suggestion}\n"
+                    parts.append("\n💡 **Sugerencias**:\n")
+                    parts.extend(f"  • {suggestion}\n" for suggestion in suggestions[:2])
             else:
-                result += "❌ No hay sesión conversacional activa\n"
+                parts.append("❌ No hay sesión conversacional activa\n")
             
             # Configuración del NLP Parser
-            result += f"\n🧠 **NLP Parser**: Threshold {self.nlp_parser.confidence_threshold}\n"
-            result += f"🔧 **Intent Router**: {len(self.intent_router.direct_handlers)} handlers directos\n"
+            parts.append(f"\n🧠 **NLP Parser**: Threshold {self.nlp_parser.confidence_threshold}\n")
+            parts.append(f"🔧 **Intent Router**: {len(self.intent_router.direct_handlers)} handlers directos\n")
             
-            return result
+            return "".join(parts)
             
         except Exception as e:
             return f"❌ Error obteniendo estado conversacional: {e}"
@@ -495,7 +548,7 @@ class CLIEngine:
         path = args[0] if args else '.'
         
         # Determinar si es archivo o proyecto
-        target_path = Path(self.settings.workspace_dir) / path
+        target_path = self._workspace_path / path
         
         if target_path.is_file():
             return self.code_analyzer.analyze_file(path)
@@ -557,12 +610,12 @@ class CLIEngine:
             if not history:
                 return "📋 No hay historial de archivos"
             
-            result = "📋 **Historial de archivos reciente:**\n\n"
+            parts = ["📋 **Historial de archivos reciente:**\n\n"]
             for entry in history:
                 timestamp = time.strftime('%H:%M:%S', time.localtime(entry['timestamp']))
-                result += f"• {timestamp} - {entry['action']} {entry['file_path']}\n"
+                parts.append(f"• {timestamp} - {entry['action']} {entry['file_path']}\n")
             
-            return result
+            return "".join(parts)
         
         elif args[0] == 'commands':
             # Mostrar comandos populares
@@ -571,11 +624,10 @@ class CLIEngine:
             if not commands:
                 return "📋 No hay historial de comandos"
             
-            result = "📋 **Comandos más utilizados:**\n\n"
-            for cmd in commands:
-                result += f"• {cmd['command']} - {cmd['usage_count']} veces\n"
+            parts = ["📋 **Comandos más utilizados:**\n\n"]
+            parts.extend(f"• {cmd['command']} - {cmd['usage_count']} veces\n" for cmd in commands)
             
-            return result
+            return "".join(parts)
         
         else:
             return "❌ Uso: /history [commands]"
@@ -594,7 +646,7 @@ class CLIEngine:
         if not sessions:
             return "📋 No hay sesiones previas en este workspace"
         
-        result = f"📋 **Últimas {len(sessions)} sesiones:**\n\n"
+        parts = [f"📋 **Últimas {len(sessions)} sesiones:**\n\n"]
         
         for session in sessions:
             start_time = time.strftime('%Y-%m-%d %H:%M', time.localtime(session['start_time']))
@@ -604,14 +656,14 @@ class CLIEngine:
                 duration_sec = session['end_time'] - session['start_time']
                 duration = f" ({duration_sec/60:.1f} min)"
             
-            result += f"• {start_time}{duration} - {session['total_messages']} mensajes\n"
+            parts.append(f"• {start_time}{duration} - {session['total_messages']} mensajes\n")
             
             if session['summary']:
-                result += f"  📄 {session['summary'][:80]}...\n"
+                parts.append(f"  📄 {session['summary'][:80]}...\n")
             
-            result += "\n"
+            parts.append("\n")
         
-        return result
+        return "".join(parts)
     
     def _cmd_projects(self, args: list) -> str:
         """Mostrar proyectos recientes"""
@@ -620,41 +672,43 @@ class CLIEngine:
         if not projects:
             return "📋 No hay proyectos registrados"
         
-        result = "📋 **Proyectos recientes:**\n\n"
+        parts = ["📋 **Proyectos recientes:**\n\n"]
         
         for project in projects:
             last_access = time.strftime('%Y-%m-%d', time.localtime(project['last_accessed']))
             
-            result += f"• **{project['project_name']}**\n"
-            result += f"  📁 {project['project_path']}\n"
-            result += f"  📅 Último acceso: {last_access}\n"
+            parts.append(f"• **{project['project_name']}**\n")
+            parts.append(f"  📁 {project['project_path']}\n")
+            parts.append(f"  📅 Último acceso: {last_access}\n")
             
             if project.get('project_type'):
-                result += f"  🏷️ Tipo: {project['project_type']}\n"
+                parts.append(f"  🏷️ Tipo: {project['project_type']}\n")
             
             if project.get('languages'):
-                result += f"  💻 Lenguajes: {', '.join(project['languages'])}\n"
+                parts.append(f"  💻 Lenguajes: {', '.join(project['languages'])}\n")
             
             if project.get('files_count'):
-                result += f"  📄 Archivos: {project['files_count']}\n"
+                parts.append(f"  📄 Archivos: {project['files_count']}\n")
             
-            result += "\n"
+            parts.append("\n")
         
-        return result
+        return "".join(parts)
     
     def _cmd_stats(self, args: list) -> str:
         """Mostrar estadísticas de memoria"""
         stats = self.context_manager.memory_store.get_memory_stats()
         
-        result = "📊 **Estadísticas de LocalClaude:**\n\n"
-        result += f"💬 Sesiones totales: {stats['total_sessions']}\n"
-        result += f"📝 Mensajes totales: {stats['total_messages']}\n"
-        result += f"📁 Proyectos registrados: {stats['total_projects']}\n"
-        result += f"📄 Archivos únicos trabajados: {stats['unique_files']}\n"
+        parts = [
+            "📊 **Estadísticas de LocalClaude:**\n\n",
+            f"💬 Sesiones totales: {stats['total_sessions']}\n",
+            f"📝 Mensajes totales: {stats['total_messages']}\n",
+            f"📁 Proyectos registrados: {stats['total_projects']}\n",
+            f"📄 Archivos únicos trabajados: {stats['unique_files']}\n"
+        ]
         
         if stats.get('most_used_command'):
             cmd_info = stats['most_used_command']
-            result += f"🔥 Comando más usado: {cmd_info['command']} ({cmd_info['count']} veces)\n"
+            parts.append(f"🔥 Comando más usado: {cmd_info['command']} ({cmd_info['count']} veces)\n")
         
         # Tamaño de base de datos
         db_size = stats['db_size']
@@ -665,9 +719,9 @@ class CLIEngine:
         else:
             size_str = f"{db_size} B"
         
-        result += f"💾 Tamaño de memoria: {size_str}\n"
+        parts.append(f"💾 Tamaño de memoria: {size_str}\n")
         
-        return result
+        return "".join(parts)
     
     def _cmd_cache_stats(self, args: list) -> str:
         """Mostrar estadísticas del cache de análisis"""
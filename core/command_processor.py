@@ -2,7 +2,14 @@
 Procesador de comandos especiales
 """
 
-from typing import Dict, Callable, List, Any, Optional
+from typing import Dict, Callable, List, Any, Optional, Set
+
+
+def safe(handler: Callable) -> Callable:
+    """Marcar un handler de comando que nunca lanza excepciones"""
+    handler._command_safe = True
+    return handler
+
 
 class CommandProcessor:
     """Procesador de comandos especiales de la CLI"""
@@ -11,10 +18,25 @@ class CommandProcessor:
         self.settings = settings
         self.commands: Dict[str, Callable] = {}
         self.command_prefix = settings.cli['command_prefix']
+        
+        # Comandos locales y triviales: no se miden ni se registran en métricas
+        self._fast_commands: Set[str] = set()
+        
+        # Handlers marcados con @safe: se llaman sin try/except
+        self._safe_commands: Dict[str, Callable] = {}
     
-    def register_command(self, command_name: str, handler: Callable):
+    def register_command(self, command_name: str, handler: Callable, fast: bool = False):
         """Registrar un nuevo comando"""
         self.commands[command_name] = handler
+        if getattr(handler, '_command_safe', False):
+            self._safe_commands[command_name] = handler
+        else:
+            self._safe_commands.pop(command_name, None)
+        
+        if fast:
+            self._fast_commands.add(command_name)
+        else:
+            self._fast_commands.discard(command_name)
     
     def process_command(self, user_input: str) -> Optional[str]:
         """
@@ -35,15 +57,28 @@ class CommandProcessor:
         if not command_text:
             return self._show_available_commands()
         
-        # Parsear comando y argumentos
-        parts = command_text.split()
-        command_name = parts[0].lower()
-        args = parts[1:] if len(parts) > 1 else []
+        # Parsear comando y argumentos: la lista de split() se reutiliza como
+        # args en lugar de copiar un slice
+        args = command_text.split()
+        command_name = args[0]
+        del args[0]
+        
+        # Camino directo para handlers que no pueden fallar
+        handler = self._safe_commands.get(command_name)
+        if handler is not None:
+            return handler(args)
+        
+        # Los comandos se escriben casi siempre en minúsculas: probar primero
+        # el nombre tal cual y solo normalizar si no se encuentra
+        handler = self.commands.get(command_name)
+        if handler is None:
+            command_name = command_name.lower()
+            handler = self.commands.get(command_name)
         
         # Ejecutar comando
-        if command_name in self.commands:
+        if handler is not None:
             try:
-                return self.commands[command_name](args)
+                return handler(args)
             except Exception as e:
                 return f"❌ Error ejecutando comando '{command_name}': {e}"
         else:
@@ -67,4 +102,8 @@ class CommandProcessor:
     
     def has_command(self, command_name: str) -> bool:
         """Verificar si un comando existe"""
-        return command_name in self.commands
\ No newline at end of file
+        return command_name in self.commands
+    
+    def is_fast(self, command_name: str) -> bool:
+        """Verificar si un comando se registró como rápido (sin métricas)"""
+        return command_name in self._fast_commands or command_name.lower() in self._fast_commands
\ No newline at end of file
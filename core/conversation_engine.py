@@ -3,14 +3,59 @@ Context Engine para mantener conversaciones fluidas
 """
 
 import json
+import sys
 import time
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass, asdict
+from collections import deque, Counter
+from itertools import islice
+from typing import Dict, List, Optional, Any, Deque, Tuple
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from core.nlp_parser import ParsedIntent, IntentType
 
+# Número de acciones recientes que se conservan en el contexto
+MAX_RECENT_ACTIONS = 5
 
-@dataclass
+# Intents que definen la tarea actual de la conversación
+_TASK_INTENTS = frozenset({IntentType.ANALYZE, IntentType.CREATE, IntentType.OPTIMIZE})
+
+def _tail(items: Deque, n: int) -> Tuple:
+    """Últimos n elementos de un deque (los deques no admiten slicing)"""
+    return tuple(islice(items, max(0, len(items) - n), None))
+
+
+# Búsqueda de intents guardados, por valor ("analyze") o por nombre ("ANALYZE")
+_INTENT_BY_VALUE = {intent.value: intent for intent in IntentType}
+_INTENT_BY_NAME = {intent.name: intent for intent in IntentType}
+
+
+def _intent_from_saved(value: Any) -> IntentType:
+    """Convertir un intent guardado en IntentType (acepta el formato antiguo "IntentType.X")"""
+    # Un contexto corrupto o editado a mano puede traer cualquier tipo
+    if not isinstance(value, str):
+        return IntentType.UNKNOWN
+    return (_INTENT_BY_VALUE.get(value)
+            or _INTENT_BY_NAME.get(value.removeprefix("IntentType."))
+            or IntentType.UNKNOWN)
+
+
+# Continuaciones sugeridas según el último intent (máximo 2 por intent)
+_SUGGESTIONS_BY_INTENT: Dict[IntentType, Tuple[str, ...]] = {
+    IntentType.ANALYZE: (
+        "¿Quieres que optimice los problemas encontrados?",
+        "¿Te interesa ver métricas específicas?"
+    ),
+    IntentType.CREATE: (
+        "¿Quieres que analice lo que creé?",
+        "¿Debo generar tests para esto?"
+    ),
+    IntentType.OPTIMIZE: (
+        "¿Quieres que analice el resultado?",
+        "¿Debo hacer más optimizaciones?"
+    )
+}
+
+
+@dataclass(slots=True)
 class ConversationTurn:
     """Un turno de conversación"""
     timestamp: float
@@ -21,31 +66,69 @@ class ConversationTurn:
     success: bool = True
 
 
-@dataclass 
+@dataclass(slots=True)
 class ConversationContext:
     """Contexto de conversación actual"""
     session_id: str
     started_at: float
     current_task: Optional[str] = None
     current_target: Optional[str] = None
-    user_preferences: Dict[str, Any] = None
-    recent_actions: List[str] = None
+    recent_actions: Deque[str] = None
+    
+    # Preferencias aprendidas del usuario
+    intent_counts: Counter = None   # IntentType -> veces
+    target_counts: Counter = None   # target -> veces
+    detail_counts: Counter = None   # (clave, valor) de action_details -> veces
     
     def __post_init__(self):
-        if self.user_preferences is None:
-            self.user_preferences = {}
-        if self.recent_actions is None:
-            self.recent_actions = []
+        self.intent_counts = Counter(self.intent_counts or ())
+        self.target_counts = Counter(self.target_counts or ())
+        self.detail_counts = Counter(self.detail_counts or ())
+        # Deque acotado: las acciones antiguas se descartan solas en O(1)
+        self.recent_actions = deque(self.recent_actions or (), maxlen=MAX_RECENT_ACTIONS)
 
 
 class ConversationEngine:
-    """Motor conversacional para mantener contexto y estado"""
+    """
+    Motor conversacional para mantener contexto y estado
+    
+    No es thread-safe: una sesión por instancia, usada desde un solo hilo.
+    """
+    
+    # Tareas que se consideran continuación de la tarea actual
+    _RELATED_TASKS = {
+        "analyze": frozenset({"optimize", "explain"}),
+        "create": frozenset({"analyze", "test"}),
+        "optimize": frozenset({"analyze", "test"})
+    }
     
     def __init__(self, max_context_turns: int = 10):
         self.max_context_turns = max_context_turns
         self.current_context = None
-        self.conversation_history = []
+        self.conversation_history: Deque[ConversationTurn] = deque(maxlen=max_context_turns)
         self.session_start = time.time()
+        self._reset_aggregates()
+        
+        # Descripciones "intent:target" ya construidas (internadas)
+        self._action_desc_cache: Dict[Tuple[IntentType, Optional[str]], str] = {}
+        
+    def _reset_aggregates(self):
+        """Reiniciar los agregados que se mantienen turno a turno"""
+        # Sobre los turnos en conversation_history
+        self._success_count = 0
+        self._fail_count = 0
+        self._exec_time_sum = 0.0
+        
+        # Contexto para el LLM, válido hasta el próximo turno
+        self._context_cache: Optional[Dict[str, Any]] = None
+    
+    def _account_turn(self, turn: ConversationTurn, sign: int):
+        """Sumar (sign=1) o restar (sign=-1) un turno de los agregados del historial"""
+        if turn.success:
+            self._success_count += sign
+        else:
+            self._fail_count += sign
+        self._exec_time_sum += sign * turn.execution_time
         
     def start_conversation(self, session_id: str = None) -> str:
         """Iniciar nueva conversación"""
@@ -56,15 +139,17 @@ class ConversationEngine:
             session_id=session_id,
             started_at=time.time()
         )
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=self.max_context_turns)
+        self._reset_aggregates()
         
         return session_id
     
     def add_turn(self, user_input: str, parsed_intent: ParsedIntent, 
-                 response: str, execution_time: float, success: bool = True):
-        """Agregar turno de conversación"""
+                 response: str, execution_time: float, success: bool = True,
+                 timestamp: Optional[float] = None):
+        """Agregar turno de conversación (timestamp: momento del turno, por defecto ahora)"""
         turn = ConversationTurn(
-            timestamp=time.time(),
+            timestamp=time.time() if timestamp is None else timestamp,
             user_input=user_input,
             parsed_intent=parsed_intent,
             response=response,
@@ -72,11 +157,12 @@ class ConversationEngine:
             success=success
         )
         
+        # El deque mantiene solo los últimos N turnos: descontar el que sale
+        if len(self.conversation_history) == self.conversation_history.maxlen:
+            self._account_turn(self.conversation_history[0], -1)
         self.conversation_history.append(turn)
-        
-        # Mantener solo los últimos N turnos
-        if len(self.conversation_history) > self.max_context_turns:
-            self.conversation_history = self.conversation_history[-self.max_context_turns:]
+        self._account_turn(turn, 1)
+        self._context_cache = None
         
         # Actualizar contexto
         self._update_context(turn)
@@ -89,85 +175,114 @@ class ConversationEngine:
         intent = turn.parsed_intent
         
         # Actualizar tarea actual
-        if intent.intent in [IntentType.ANALYZE, IntentType.CREATE, IntentType.OPTIMIZE]:
+        if intent.intent in _TASK_INTENTS:
             self.current_context.current_task = intent.intent.value
             if intent.target:
                 self.current_context.current_target = intent.target
         
         # Actualizar acciones recientes
-        action_desc = f"{intent.intent.value}:{intent.target or 'general'}"
-        self.current_context.recent_actions.append(action_desc)
-        
-        # Mantener solo las últimas 5 acciones
-        if len(self.current_context.recent_actions) > 5:
-            self.current_context.recent_actions = self.current_context.recent_actions[-5:]
+        self.current_context.recent_actions.append(self._action_desc(intent))
         
         # Aprender preferencias del usuario
         self._learn_preferences(intent)
     
+    def _action_desc(self, intent: ParsedIntent) -> str:
+        """Descripción "intent:target" de una acción, reutilizada entre turnos"""
+        key = (intent.intent, intent.target)
+        action_desc = self._action_desc_cache.get(key)
+        if action_desc is None:
+            # Los targets vienen del usuario: acotar el tamaño del caché
+            if len(self._action_desc_cache) >= 256:
+                self._action_desc_cache.clear()
+            action_desc = sys.intern(f"{intent.intent.value}:{intent.target or 'general'}")
+            self._action_desc_cache[key] = action_desc
+        return action_desc
+    
     def _learn_preferences(self, intent: ParsedIntent):
         """Aprender preferencias del usuario"""
         if not self.current_context:
             return
             
-        prefs = self.current_context.user_preferences
+        context = self.current_context
         
         # Contar frecuencia de intents
-        intent_key = f"intent_{intent.intent.value}"
-        prefs[intent_key] = prefs.get(intent_key, 0) + 1
+        context.intent_counts[intent.intent] += 1
         
         # Targets preferidos
         if intent.target:
-            target_key = "preferred_targets"
-            if target_key not in prefs:
-                prefs[target_key] = {}
-            prefs[target_key][intent.target] = prefs[target_key].get(intent.target, 0) + 1
+            context.target_counts[intent.target] += 1
         
         # Detalles de acción
         if intent.action_details:
-            for key, value in intent.action_details.items():
-                detail_key = f"pref_{key}_{value}"
-                prefs[detail_key] = prefs.get(detail_key, 0) + 1
+            context.detail_counts.update(intent.action_details.items())
     
     def get_context_for_llm(self) -> Dict[str, Any]:
-        """Obtener contexto optimizado para LLM"""
+        """Obtener contexto optimizado para LLM
+        
+        Solo cambia al agregar turnos, así que se reutiliza entre turnos;
+        la duración de la sesión se calcula en cada llamada.
+        """
         if not self.current_context:
             return {}
         
-        # Contexto comprimido y específico
-        recent_turns = self.conversation_history[-3:]  # Solo últimos 3 turnos
+        if self._context_cache is None:
+            self._context_cache = self._build_context_for_llm()
         
         return {
-            "session_duration_minutes": (time.time() - self.current_context.started_at) / 60,
+            **self._context_cache,
+            "session_duration_minutes": (time.time() - self.current_context.started_at) / 60
+        }
+    
+    def _build_context_for_llm(self) -> Dict[str, Any]:
+        """Construir la parte del contexto que no cambia entre turnos"""
+        # Contexto comprimido y específico: tuplas inmutables, seguras de
+        # compartir entre llamadas
+        return {
             "current_task": self.current_context.current_task,
             "current_target": self.current_context.current_target,
-            "recent_actions": self.current_context.recent_actions[-3:],
-            "recent_conversation": [
-                {
-                    "user": turn.user_input,
-                    "intent": turn.parsed_intent.intent.value,
-                    "success": turn.success
-                }
-                for turn in recent_turns
-            ],
+            "recent_actions": _tail(self.current_context.recent_actions, 3),
+            # Tuplas (user, intent, success) en lugar de un dict por turno
+            "recent_conversation": tuple(
+                (turn.user_input, turn.parsed_intent.intent.value, turn.success)
+                for turn in _tail(self.conversation_history, 3)  # Solo últimos 3 turnos
+            ),
             "user_patterns": self._get_user_patterns(),
             "suggested_continuations": self._get_suggested_continuations()
         }
     
+    def get_status_context(self) -> Dict[str, Any]:
+        """Obtener solo el contexto que muestra el intent de status"""
+        if not self.current_context:
+            return {}
+        
+        return {
+            "current_task": self.current_context.current_task,
+            "current_target": self.current_context.current_target,
+            "recent_actions": _tail(self.current_context.recent_actions, 3),
+            "suggested_continuations": self._get_suggested_continuations()
+        }
+    
+    def get_help_context(self) -> Dict[str, Any]:
+        """Obtener solo el contexto que muestra el intent de ayuda"""
+        if not self.current_context:
+            return {}
+        
+        return {
+            "current_task": self.current_context.current_task,
+            "suggested_continuations": self._get_suggested_continuations()[:1]
+        }
+    
     def _get_user_patterns(self) -> Dict[str, Any]:
         """Analizar patrones del usuario"""
         if not self.current_context:
             return {}
             
-        prefs = self.current_context.user_preferences
-        
-        # Intent más frecuente
-        intent_counts = {k: v for k, v in prefs.items() if k.startswith("intent_")}
-        most_common_intent = max(intent_counts.items(), key=lambda x: x[1])[0].replace("intent_", "") if intent_counts else None
+        # Intent y target más frecuentes (contadores mantenidos en _learn_preferences)
+        top_intent = self.current_context.intent_counts.most_common(1)
+        most_common_intent = top_intent[0][0].value if top_intent else None
         
-        # Target más frecuente
-        preferred_targets = prefs.get("preferred_targets", {})
-        most_common_target = max(preferred_targets.items(), key=lambda x: x[1])[0] if preferred_targets else None
+        top_target = self.current_context.target_counts.most_common(1)
+        most_common_target = top_target[0][0] if top_target else None
         
         return {
             "most_common_intent": most_common_intent,
@@ -175,35 +290,13 @@ class ConversationEngine:
             "total_interactions": len(self.conversation_history)
         }
     
-    def _get_suggested_continuations(self) -> List[str]:
+    def _get_suggested_continuations(self) -> Tuple[str, ...]:
         """Sugerir continuaciones basadas en contexto"""
         if not self.current_context or not self.conversation_history:
-            return []
-        
-        suggestions = []
-        last_turn = self.conversation_history[-1]
+            return ()
         
         # Sugerencias basadas en el último intent
-        if last_turn.parsed_intent.intent == IntentType.ANALYZE:
-            suggestions.extend([
-                "¿Quieres que optimice los problemas encontrados?",
-                "¿Te interesa ver métricas específicas?",
-                "¿Debo crear un reporte detallado?"
-            ])
-        elif last_turn.parsed_intent.intent == IntentType.CREATE:
-            suggestions.extend([
-                "¿Quieres que analice lo que creé?",
-                "¿Debo generar tests para esto?",
-                "¿Te ayudo a integrarlo con el proyecto?"
-            ])
-        elif last_turn.parsed_intent.intent == IntentType.OPTIMIZE:
-            suggestions.extend([
-                "¿Quieres que analice el resultado?",
-                "¿Debo hacer más optimizaciones?",
-                "¿Te interesa ver las métricas de mejora?"
-            ])
-        
-        return suggestions[:2]  # Máximo 2 sugerencias
+        return _SUGGESTIONS_BY_INTENT.get(self.conversation_history[-1].parsed_intent.intent, ())
     
     def is_continuation_of_task(self, new_intent: ParsedIntent) -> bool:
         """Verificar si es continuación de tarea actual"""
@@ -216,38 +309,23 @@ class ConversationEngine:
             return True
         
         # Tareas relacionadas
-        related_tasks = {
-            "analyze": ["optimize", "explain"],
-            "create": ["analyze", "test"],
-            "optimize": ["analyze", "test"]
-        }
-        
-        current_task = self.current_context.current_task
-        if current_task in related_tasks:
-            return new_intent.intent.value in related_tasks[current_task]
-        
-        return False
+        return new_intent.intent.value in self._RELATED_TASKS.get(self.current_context.current_task, ())
     
     def get_session_summary(self) -> Dict[str, Any]:
         """Obtener resumen de la sesión"""
         if not self.current_context:
             return {}
         
-        successful_turns = [t for t in self.conversation_history if t.success]
-        failed_turns = [t for t in self.conversation_history if not t.success]
-        
-        avg_execution_time = (
-            sum(t.execution_time for t in self.conversation_history) / 
-            len(self.conversation_history)
-        ) if self.conversation_history else 0
+        total_turns = len(self.conversation_history)
+        avg_execution_time = self._exec_time_sum / total_turns if total_turns else 0
         
         return {
             "session_id": self.current_context.session_id,
             "duration_minutes": (time.time() - self.current_context.started_at) / 60,
-            "total_turns": len(self.conversation_history),
-            "successful_turns": len(successful_turns),
-            "failed_turns": len(failed_turns),
-            "success_rate": len(successful_turns) / len(self.conversation_history) if self.conversation_history else 0,
+            "total_turns": total_turns,
+            "successful_turns": self._success_count,
+            "failed_turns": self._fail_count,
+            "success_rate": self._success_count / total_turns if total_turns else 0,
             "avg_execution_time": avg_execution_time,
             "current_task": self.current_context.current_task,
             "user_patterns": self._get_user_patterns()
@@ -258,14 +336,79 @@ class ConversationEngine:
         if not self.current_context:
             return
             
-        data = {
-            "context": asdict(self.current_context),
-            "conversation_history": [asdict(turn) for turn in self.conversation_history],
-            "session_start": self.session_start
-        }
+        # Se escribe turno a turno: nunca se tiene todo el historial serializado
+        # en memoria. Sin indent ni default, json usa su codificador en C.
+        encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
         
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, default=str)
+            f.write('{"context":')
+            f.write(encode(self._context_to_dict(self.current_context)))
+            f.write(',"conversation_history":[')
+            for i, turn in enumerate(self.conversation_history):
+                if i:
+                    f.write(',')
+                f.write(encode(self._turn_to_dict(turn)))
+            f.write('],"session_start":')
+            f.write(encode(self.session_start))
+            f.write('}')
+    
+    @staticmethod
+    def _turn_to_dict(turn: ConversationTurn) -> Dict[str, Any]:
+        """Serializar un turno (el intent se guarda por su valor)"""
+        parsed_intent = turn.parsed_intent
+        return {
+            "timestamp": turn.timestamp,
+            "user_input": turn.user_input,
+            "parsed_intent": {
+                "intent": parsed_intent.intent.value,
+                "confidence": parsed_intent.confidence,
+                "target": parsed_intent.target,
+                "action_details": parsed_intent.action_details,
+                "original_text": parsed_intent.original_text
+            },
+            "response": turn.response,
+            "execution_time": turn.execution_time,
+            "success": turn.success
+        }
+    
+    @staticmethod
+    def _context_to_dict(context: ConversationContext) -> Dict[str, Any]:
+        """Serializar el contexto con tipos compatibles con JSON"""
+        return {
+            "session_id": context.session_id,
+            "started_at": context.started_at,
+            "current_task": context.current_task,
+            "current_target": context.current_target,
+            "recent_actions": list(context.recent_actions),
+            "intent_counts": {intent.value: count for intent, count in context.intent_counts.items()},
+            "target_counts": dict(context.target_counts),
+            "detail_counts": [[key, value, count] for (key, value), count in context.detail_counts.items()]
+        }
+    
+    @staticmethod
+    def _context_from_dict(data: Dict[str, Any]) -> ConversationContext:
+        """Reconstruir el contexto guardado por _context_to_dict"""
+        intent_counts = Counter({_intent_from_saved(value): count for value, count in data.get("intent_counts", {}).items()})
+        target_counts = Counter(data.get("target_counts", {}))
+        detail_counts = Counter({(key, value): count for key, value, count in data.get("detail_counts", [])})
+        
+        # Formato antiguo: preferencias en un dict con claves de texto
+        prefs = data.get("user_preferences") or {}
+        for key, count in prefs.items():
+            if key.startswith("intent_"):
+                intent_counts[_intent_from_saved(key[len("intent_"):])] += count
+        target_counts.update(prefs.get("preferred_targets", {}))
+        
+        return ConversationContext(
+            session_id=data["session_id"],
+            started_at=data["started_at"],
+            current_task=data.get("current_task"),
+            current_target=data.get("current_target"),
+            recent_actions=data.get("recent_actions"),
+            intent_counts=intent_counts,
+            target_counts=target_counts,
+            detail_counts=detail_counts
+        )
     
     def load_context(self, filepath: str):
         """Cargar contexto desde archivo"""
@@ -274,38 +417,17 @@ class ConversationEngine:
                 data = json.load(f)
             
             # Reconstruir contexto
-            self.current_context = ConversationContext(**data["context"])
+            self.current_context = self._context_from_dict(data["context"])
             self.session_start = data["session_start"]
             
             # Reconstruir historial (simplificado)
-            self.conversation_history = []
+            self.conversation_history = deque(maxlen=self.max_context_turns)
             for turn_data in data["conversation_history"]:
                 # Crear ParsedIntent simplificado
                 intent_data = turn_data["parsed_intent"]
                 
-                # Extraer enum correctamente - handle both string values and IntentType names
-                intent_value = intent_data["intent"]
-                if isinstance(intent_value, str):
-                    if intent_value.startswith("IntentType."):
-                        intent_value = intent_value.replace("IntentType.", "")
-                    # Map enum names to values
-                    intent_name_to_value = {
-                        "ANALYZE": "analyze",
-                        "CREATE": "create", 
-                        "MODIFY": "modify",
-                        "FIND": "find",
-                        "EXPLAIN": "explain",
-                        "OPTIMIZE": "optimize",
-                        "TEST": "test",
-                        "STATUS": "status",
-                        "HELP": "help",
-                        "UNKNOWN": "unknown"
-                    }
-                    if intent_value in intent_name_to_value:
-                        intent_value = intent_name_to_value[intent_value]
-                
                 parsed_intent = ParsedIntent(
-                    intent=IntentType(intent_value),
+                    intent=_intent_from_saved(intent_data["intent"]),
                     confidence=intent_data["confidence"],
                     target=intent_data.get("target"),
                     action_details=intent_data.get("action_details", {}),
@@ -321,7 +443,12 @@ class ConversationEngine:
                     success=turn_data.get("success", True)
                 )
                 self.conversation_history.append(turn)
+            
+            # Reconstruir agregados a partir del historial
+            self._reset_aggregates()
+            for turn in self.conversation_history:
+                self._account_turn(turn, 1)
                 
-        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, ValueError):
             # Si falla la carga, iniciar contexto limpio
             self.start_conversation()
\ No newline at end of file
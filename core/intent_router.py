@@ -7,10 +7,90 @@ from typing import Dict, Optional, Any, Callable
 from core.nlp_parser import ParsedIntent, IntentType
 from core.conversation_engine import ConversationEngine
 
+# task_type para model switching según el intent (el resto usa "general")
+_TASK_TYPE_BY_INTENT = {
+    IntentType.ANALYZE: "complex",   # DeepSeek para reasoning
+    IntentType.OPTIMIZE: "complex",
+    IntentType.CREATE: "coding",     # Modelo rápido para generación
+    IntentType.EXPLAIN: "coding"
+}
+
+# Partes fijas del prompt de sistema para el LLM
+_IDENTITY_PREFIX = "Eres LocalClaude, un asistente conversacional para desarrollo. Responde de forma natural y útil."
+_RESPONSE_TAIL = "Responde de forma conversacional, no como comando. Si necesitas acción específica, sé proactivo."
+
+_INTENT_PROMPTS = {
+    IntentType.ANALYZE: "El usuario quiere que analices código/proyecto. Enfócate en findings específicos y sugerencias.",
+    IntentType.CREATE: "El usuario quiere crear algo. Pregunta detalles si necesitas y genera contenido útil.",
+    IntentType.OPTIMIZE: "El usuario quiere optimizar algo. Identifica bottlenecks y sugiere mejoras específicas.",
+    IntentType.EXPLAIN: "El usuario quiere explicación. Sé claro, didáctico y da ejemplos.",
+    IntentType.FIND: "El usuario busca algo. Ayúdale a localizar lo que necesita."
+}
+
+# Identidad + descripción del intent, ya unidas
+_PROMPT_TEMPLATE = {
+    intent: f"{_IDENTITY_PREFIX}\n\n{description}"
+    for intent, description in _INTENT_PROMPTS.items()
+}
+
+# Plantilla del intent de status (campos de get_session_summary y get_status_context)
+_STATUS_TEMPLATE = """📊 **Estado de la Conversación**
+
+⏱️ **Duración**: {duration_minutes:.1f} minutos
+🔢 **Turnos**: {total_turns} ({successful_turns} exitosos)
+⚡ **Tiempo promedio**: {avg_execution_time:.2f}s
+✅ **Tasa de éxito**: {success_rate:.1%}
+
+🎯 **Contexto Actual**:
+• **Tarea**: {current_task}
+• **Objetivo**: {current_target}
+• **Acciones recientes**: {recent_actions}"""
+
+_STATUS_SUGGESTIONS_HEADER = "\n\n💡 **Sugerencias**:\n"
+
+# Texto fijo de la ayuda conversacional
+_BASE_HELP = """🤖 **LocalClaude - Ayuda Conversacional**
+
+Puedes hablar conmigo naturalmente:
+
+🔍 **Análisis**:
+• "Analiza este proyecto"
+• "Qué problemas tiene el código"
+• "Revisa el performance"
+
+🏗️ **Creación**:
+• "Crea una nueva función"
+• "Genera una API REST"
+• "Hacer un proyecto Python"
+
+🔧 **Optimización**:
+• "Optimiza este código"
+• "Mejora el performance"
+• "Acelera la función X"
+
+📊 **Estado**:
+• "Estado del proyecto"
+• "Métricas del sistema"
+• "Progreso actual"
+
+🔎 **Búsqueda**:
+• "Busca la función main"
+• "Dónde está definida la clase X"
+
+💡 **Ejemplo**: En lugar de `/analyze --metrics performance`, simplemente di "Analiza el performance de este proyecto"
+"""
+
 
 class IntentRouter:
     """Router de intenciones para decidir cómo procesar cada intent"""
     
+    # Intents que pueden manejarse con tools del workspace
+    _TOOL_INTENTS = {
+        IntentType.ANALYZE: "code_analyzer",
+        IntentType.FIND: "workspace_explorer",
+        IntentType.CREATE: "file_manager"
+    }
+    
     def __init__(self, conversation_engine: ConversationEngine):
         self.conversation_engine = conversation_engine
         self.direct_handlers = {}
@@ -35,19 +115,26 @@ class IntentRouter:
         """Configurar herramientas del workspace"""
         self.workspace_tools = tools
     
-    def route_intent(self, user_input: str, parsed_intent: ParsedIntent) -> Dict[str, Any]:
-        """Rutear intent y devolver respuesta"""
-        start_time = time.time()
+    def route_intent(self, user_input: str, parsed_intent: ParsedIntent,
+                     stream_callback: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """Rutear intent y devolver respuesta
+        
+        stream_callback recibe los fragmentos de la respuesta LLM según se generan;
+        las respuestas directas o de herramientas no se transmiten.
+        """
+        # Reloj de pared solo para fechar el turno; las duraciones, con monotonic
+        received_at = time.time()
+        start_time = time.monotonic()
         
         try:
             # 1. Verificar si puede manejarse directamente
             if self._can_handle_directly(parsed_intent):
                 response = self._handle_directly(parsed_intent)
-                execution_time = time.time() - start_time
+                execution_time = time.monotonic() - start_time
                 
                 # Registrar en conversación
                 self.conversation_engine.add_turn(
-                    user_input, parsed_intent, response, execution_time, True
+                    user_input, parsed_intent, response, execution_time, True, timestamp=received_at
                 )
                 
                 return {
@@ -60,10 +147,10 @@ class IntentRouter:
             # 2. Verificar si puede manejarse con workspace tools
             elif self._can_handle_with_tools(parsed_intent):
                 response = self._handle_with_tools(parsed_intent)
-                execution_time = time.time() - start_time
+                execution_time = time.monotonic() - start_time
                 
                 self.conversation_engine.add_turn(
-                    user_input, parsed_intent, response, execution_time, True
+                    user_input, parsed_intent, response, execution_time, True, timestamp=received_at
                 )
                 
                 return {
@@ -75,12 +162,12 @@ class IntentRouter:
             
             # 3. Enviar a LLM con contexto enriquecido
             else:
-                response = self._handle_with_llm(user_input, parsed_intent)
-                execution_time = time.time() - start_time
+                response = self._handle_with_llm(user_input, parsed_intent, stream_callback)
+                execution_time = time.monotonic() - start_time
                 
                 success = response is not None
                 self.conversation_engine.add_turn(
-                    user_input, parsed_intent, response or "Error en LLM", execution_time, success
+                    user_input, parsed_intent, response or "Error en LLM", execution_time, success, timestamp=received_at
                 )
                 
                 return {
@@ -90,12 +177,14 @@ class IntentRouter:
                     "success": success
                 }
                 
-        except Exception as e:
-            execution_time = time.time() - start_time
+        except (AttributeError, KeyError, TypeError) as e:
+            # Fallos previsibles de los handlers directos (tools y LLM capturan
+            # los suyos); lo inesperado lo registra CLIEngine._handle_conversation
+            execution_time = time.monotonic() - start_time
             error_response = f"Error procesando solicitud: {str(e)}"
             
             self.conversation_engine.add_turn(
-                user_input, parsed_intent, error_response, execution_time, False
+                user_input, parsed_intent, error_response, execution_time, False, timestamp=received_at
             )
             
             return {
@@ -117,14 +206,7 @@ class IntentRouter:
         if parsed_intent.confidence < 0.6:
             return False
             
-        # Intents que pueden manejarse con tools del workspace
-        tool_intents = {
-            IntentType.ANALYZE: "code_analyzer",
-            IntentType.FIND: "workspace_explorer", 
-            IntentType.CREATE: "file_manager"
-        }
-        
-        intent_tool = tool_intents.get(parsed_intent.intent)
+        intent_tool = self._TOOL_INTENTS.get(parsed_intent.intent)
         return intent_tool is not None and intent_tool in self.workspace_tools
     
     def _handle_directly(self, parsed_intent: ParsedIntent) -> str:
@@ -140,63 +222,28 @@ class IntentRouter:
             return "📊 **Estado**: No hay conversación activa"
         
         summary = self.conversation_engine.get_session_summary()
-        context = self.conversation_engine.get_context_for_llm()
+        context = self.conversation_engine.get_status_context()
+        
+        response = _STATUS_TEMPLATE.format_map({
+            **summary,
+            **context,
+            'recent_actions': ', '.join(context['recent_actions'])
+        })
         
-        response = f"""📊 **Estado de la Conversación**
-
-⏱️ **Duración**: {summary['duration_minutes']:.1f} minutos
-🔢 **Turnos**: {summary['total_turns']} ({summary['successful_turns']} exitosos)
-⚡ **Tiempo promedio**: {summary['avg_execution_time']:.2f}s
-✅ **Tasa de éxito**: {summary['success_rate']:.1%}
-
-🎯 **Contexto Actual**:
-• **Tarea**: {context.get('current_task', 'Ninguna')}
-• **Objetivo**: {context.get('current_target', 'Ninguno')}
-• **Acciones recientes**: {', '.join(context.get('recent_actions', []))}"""
-
         # Agregar sugerencias si las hay
-        suggestions = context.get('suggested_continuations', [])
+        suggestions = context['suggested_continuations']
         if suggestions:
-            response += f"\n\n💡 **Sugerencias**:\n" + "\n".join(f"• {s}" for s in suggestions)
+            response += _STATUS_SUGGESTIONS_HEADER + "\n".join(f"• {s}" for s in suggestions)
         
         return response
     
     def _handle_help(self, parsed_intent: ParsedIntent) -> str:
         """Manejar intent de ayuda"""
-        base_help = """🤖 **LocalClaude - Ayuda Conversacional**
-
-Puedes hablar conmigo naturalmente:
-
-🔍 **Análisis**:
-• "Analiza este proyecto"
-• "Qué problemas tiene el código"
-• "Revisa el performance"
-
-🏗️ **Creación**:
-• "Crea una nueva función"
-• "Genera una API REST"
-• "Hacer un proyecto Python"
-
-🔧 **Optimización**:
-• "Optimiza este código"
-• "Mejora el performance"
-• "Acelera la función X"
-
-📊 **Estado**:
-• "Estado del proyecto"
-• "Métricas del sistema"
-• "Progreso actual"
-
-🔎 **Búsqueda**:
-• "Busca la función main"
-• "Dónde está definida la clase X"
-
-💡 **Ejemplo**: En lugar de `/analyze --metrics performance`, simplemente di "Analiza el performance de este proyecto"
-"""
+        base_help = _BASE_HELP
         
         # Contexto específico si está en una conversación
         if self.conversation_engine.current_context:
-            context = self.conversation_engine.get_context_for_llm()
+            context = self.conversation_engine.get_help_context()
             if context.get('current_task'):
                 base_help += f"\n🎯 **Contexto actual**: Estás trabajando en {context['current_task']}"
                 
@@ -209,26 +256,28 @@ Puedes hablar conmigo naturalmente:
     def _handle_with_tools(self, parsed_intent: ParsedIntent) -> str:
         """Manejar intent con herramientas del workspace"""
         try:
+            # Una sola búsqueda de la herramienta asociada al intent
+            tool = self.workspace_tools.get(self._TOOL_INTENTS.get(parsed_intent.intent))
+            if tool is None:
+                return "Herramienta no disponible para este intent"
+            
             if parsed_intent.intent == IntentType.ANALYZE:
-                analyzer = self.workspace_tools.get("code_analyzer")
-                if analyzer and hasattr(analyzer, 'analyze_project'):
+                if hasattr(tool, 'analyze_project'):
                     target = parsed_intent.target or "."
-                    result = analyzer.analyze_project(target)
+                    result = tool.analyze_project(target)
                     return f"📊 **Análisis completado**:\n{result}"
             
             elif parsed_intent.intent == IntentType.FIND:
-                explorer = self.workspace_tools.get("workspace_explorer")
-                if explorer and hasattr(explorer, 'find_files'):
+                if hasattr(tool, 'find_files'):
                     target = parsed_intent.target or "*"
-                    result = explorer.find_files(target)
+                    result = tool.find_files(target)
                     return f"🔍 **Búsqueda completada**:\n{result}"
             
             elif parsed_intent.intent == IntentType.CREATE:
-                file_manager = self.workspace_tools.get("file_manager")
-                if file_manager and hasattr(file_manager, 'create_file'):
+                if hasattr(tool, 'create_file'):
                     target = parsed_intent.target or "new_file.py"
                     file_type = parsed_intent.action_details.get("type", "python")
-                    result = file_manager.create_file(target, file_type)
+                    result = tool.create_file(target, file_type)
                     return f"📁 **Archivo creado**:\n{result}"
             
             return "Herramienta no disponible para este intent"
@@ -236,7 +285,8 @@ Puedes hablar conmigo naturalmente:
         except Exception as e:
             return f"Error usando herramientas: {str(e)}"
     
-    def _handle_with_llm(self, user_input: str, parsed_intent: ParsedIntent) -> Optional[str]:
+    def _handle_with_llm(self, user_input: str, parsed_intent: ParsedIntent,
+                         stream_callback: Optional[Callable[[str], None]] = None) -> Optional[str]:
         """Manejar intent con LLM"""
         if not self.llm_interface:
             return "LLM no configurado"
@@ -248,7 +298,9 @@ Puedes hablar conmigo naturalmente:
             # Construir prompt optimizado para DeepSeek
             system_prompt = self._build_optimized_prompt(parsed_intent, context)
             
-            # Preparar mensajes
+            # Preparar mensajes: solo el turno actual, nunca el historial completo.
+            # El contexto previo llega resumido (tarea actual y acciones recientes),
+            # así que el tamaño del prompt no crece con la duración de la sesión.
             messages = [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_input}
@@ -258,7 +310,9 @@ Puedes hablar conmigo naturalmente:
             task_type = self._get_task_type(parsed_intent)
             
             # Llamar a LLM
-            response = self.llm_interface.chat(messages, task_type=task_type)
+            response = self.llm_interface.chat(
+                messages, task_type=task_type, stream_callback=stream_callback
+            )
             
             return response
             
@@ -267,22 +321,8 @@ Puedes hablar conmigo naturalmente:
     
     def _build_optimized_prompt(self, parsed_intent: ParsedIntent, context: Dict) -> str:
         """Construir prompt optimizado para DeepSeek"""
-        prompt_parts = []
-        
-        # 1. Identidad conversacional
-        prompt_parts.append("Eres LocalClaude, un asistente conversacional para desarrollo. Responde de forma natural y útil.")
-        
-        # 2. Intent específico
-        intent_prompts = {
-            IntentType.ANALYZE: "El usuario quiere que analices código/proyecto. Enfócate en findings específicos y sugerencias.",
-            IntentType.CREATE: "El usuario quiere crear algo. Pregunta detalles si necesitas y genera contenido útil.",
-            IntentType.OPTIMIZE: "El usuario quiere optimizar algo. Identifica bottlenecks y sugiere mejoras específicas.",
-            IntentType.EXPLAIN: "El usuario quiere explicación. Sé claro, didáctico y da ejemplos.",
-            IntentType.FIND: "El usuario busca algo. Ayúdale a localizar lo que necesita."
-        }
-        
-        if parsed_intent.intent in intent_prompts:
-            prompt_parts.append(intent_prompts[parsed_intent.intent])
+        # 1-2. Identidad conversacional e intent específico (precalculados)
+        prompt_parts = [_PROMPT_TEMPLATE.get(parsed_intent.intent, _IDENTITY_PREFIX)]
         
         # 3. Contexto de conversación
         if context.get('current_task'):
@@ -297,15 +337,10 @@ Puedes hablar conmigo naturalmente:
             prompt_parts.append(f"Target específico: {parsed_intent.target}")
         
         # 5. Instrucciones de respuesta
-        prompt_parts.append("Responde de forma conversacional, no como comando. Si necesitas acción específica, sé proactivo.")
+        prompt_parts.append(_RESPONSE_TAIL)
         
         return "\n\n".join(prompt_parts)
     
     def _get_task_type(self, parsed_intent: ParsedIntent) -> str:
         """Determinar task_type para model switching"""
-        if parsed_intent.intent in [IntentType.ANALYZE, IntentType.OPTIMIZE]:
-            return "complex"  # DeepSeek para reasoning
-        elif parsed_intent.intent in [IntentType.CREATE, IntentType.EXPLAIN]:
-            return "coding"   # Modelo rápido para generación
-        else:
-            return "general"  # Default
\ No newline at end of file
+        return _TASK_TYPE_BY_INTENT.get(parsed_intent.intent, "general")
\ No newline at end of file
@@ -4,8 +4,10 @@ NLP Parser para interpretar intenciones desde lenguaje natural
 
 import re
 import json
+import functools
+from collections import Counter
 from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 
 
@@ -23,26 +25,81 @@ class IntentType(Enum):
     UNKNOWN = "unknown"
 
 
-@dataclass
+@dataclass(slots=True)
 class ParsedIntent:
     """Resultado del parsing de una intención"""
     intent: IntentType
     confidence: float  # 0.0 - 1.0
     target: Optional[str] = None  # Archivo, directorio, concepto objetivo
-    action_details: Dict[str, Any] = None  # Detalles específicos de la acción
+    action_details: Dict[str, Any] = field(default_factory=dict)  # Detalles específicos de la acción
     original_text: str = ""
     
 
 class NLPParser:
     """Parser de intenciones desde lenguaje natural"""
     
+    # Patrones comunes para targets, en orden de prioridad (el texto ya llega en minúsculas)
+    _TARGET_PATTERNS = (
+        r"(?:archivo|file|fichero)\s+([^\s]+)",
+        r"(?:proyecto|project)\s+([^\s]+)",
+        r"(?:función|function|método|method)\s+([^\s]+)",
+        r"(?:clase|class)\s+([^\s]+)",
+        r"(?:este|esto|el|la)\s+([^\s]+)",
+        r"([^\s]+\.py)",
+        r"([^\s]+\.js)",
+        r"([^\s]+\.json)",
+        r"([^\s]+/[^\s]*)"  # Paths
+    )
+    _TARGET_RES = tuple(re.compile(p) for p in _TARGET_PATTERNS)
+    
+    # Detalles de la acción por intent: keyword -> (clave, valor), en orden de prioridad
+    _DETAIL_TABLE = {
+        IntentType.ANALYZE: {
+            # Buscar qué tipo de análisis
+            "problemas": ("focus", "issues"),
+            "errores": ("focus", "issues"),
+            "issues": ("focus", "issues"),
+            "performance": ("focus", "performance"),
+            "rendimiento": ("focus", "performance"),
+            "métricas": ("focus", "metrics"),
+            "estadísticas": ("focus", "metrics")
+        },
+        IntentType.CREATE: {
+            # Buscar tipo de archivo/proyecto
+            "api": ("type", "api"),
+            "servidor": ("type", "api"),
+            "web": ("type", "web"),
+            "frontend": ("type", "web"),
+            "función": ("type", "function"),
+            "método": ("type", "function"),
+            "clase": ("type", "class")
+        },
+        IntentType.OPTIMIZE: {
+            # Buscar qué optimizar
+            "memoria": ("target", "memory"),
+            "velocidad": ("target", "speed"),
+            "tiempo": ("target", "speed"),
+            "cpu": ("target", "cpu")
+        }
+    }
+    
+    # Detalle por defecto si no aparece ninguna keyword
+    _DETAIL_DEFAULTS = {IntentType.ANALYZE: ("focus", "general")}
+    
+    # Todos a la vez: si no coincide ninguno no hace falta probarlos por orden
+    _TARGET_ANY_RE = re.compile("|".join(f"(?:{p})" for p in _TARGET_PATTERNS))
+    
     def __init__(self):
         self.patterns = self._load_intent_patterns()
+        self._keyword_index = self._build_keyword_index()
+        
+        # El resultado solo depende del texto normalizado: memo por instancia
+        self._parse_normalized = functools.lru_cache(maxsize=512)(self._parse_uncached)
         self.confidence_threshold = 0.4  # Threshold más bajo para ser más permisivo
     
     def _load_intent_patterns(self) -> Dict[IntentType, List[Dict]]:
-        """Cargar patrones de intenciones con confianza"""
-        return {
+        """Cargar patrones de intenciones con confianza (en "compiled", los del grupo unidos en una regex)"""
+        patterns = {
             IntentType.ANALYZE: [
                 {
                     "patterns": [
@@ -131,6 +188,37 @@ class NLPParser:
                 }
             ]
         }
+        
+        for pattern_groups in patterns.values():
+            for pattern_group in pattern_groups:
+                # Solo importa si algún patrón coincide: una alternancia basta
+                pattern_group["compiled"] = re.compile(
+                    "|".join(f"(?:{p})" for p in pattern_group["patterns"]), re.IGNORECASE
+                )
+        
+        return patterns
+    
+    def _build_keyword_index(self) -> Tuple[Tuple[str, Tuple[Tuple[IntentType, int], ...]], ...]:
+        """
+        Indexar las keywords de todos los grupos: cada keyword distinta, con los
+        (intent, grupo) que la usan, para buscarla una sola vez por texto
+        """
+        tags: Dict[str, List[Tuple[IntentType, int]]] = {}
+        for intent_type, pattern_groups in self.patterns.items():
+            for group_index, pattern_group in enumerate(pattern_groups):
+                for keyword in pattern_group["keywords"]:
+                    tags.setdefault(keyword.lower(), []).append((intent_type, group_index))
+        
+        return tuple((keyword, tuple(keyword_tags)) for keyword, keyword_tags in tags.items())
+    
+    def _count_keyword_hits(self, text: str) -> Counter:
+        """Contar, por (intent, grupo), cuántas keywords aparecen en el texto"""
+        hits = Counter()
+        for keyword, keyword_tags in self._keyword_index:
+            if keyword in text:
+                for tag in keyword_tags:
+                    hits[tag] += 1
+        return hits
     
     def parse(self, text: str) -> ParsedIntent:
         """Parsear texto natural y extraer intención"""
@@ -144,56 +232,68 @@ class NLPParser:
                 original_text=text or ""
             )
         
-        text_lower = text.lower().strip()
+        intent, confidence, target, action_details = self._parse_normalized(text.lower().strip())
         
+        # dict propio en cada llamada: el resto del pipeline puede modificarlo
+        return ParsedIntent(
+            intent=intent,
+            confidence=confidence,
+            target=target,
+            action_details=dict(action_details),
+            original_text=text
+        )
+    
+    def parse_many(self, texts: List[str]) -> List[ParsedIntent]:
+        """
+        Parsear un lote de textos (replay de logs, fixtures). Secuencial: re
+        no libera el GIL, así que un pool de hilos no aceleraría; los textos
+        repetidos se resuelven desde la memo de _parse_normalized
+        """
+        return [self.parse(text) for text in texts]
+    
+    def _parse_uncached(self, text_lower: str) -> Tuple[IntentType, float, Optional[str], Tuple[Tuple[str, Any], ...]]:
+        """Clasificar texto ya normalizado (los detalles, como tupla inmutable)"""
         # Buscar patrones de intención
         best_match = None
         best_confidence = 0.0
         best_intent = IntentType.UNKNOWN
+        keyword_hits = self._count_keyword_hits(text_lower)
         
         for intent_type, pattern_groups in self.patterns.items():
-            for pattern_group in pattern_groups:
-                confidence = self._calculate_confidence(text_lower, pattern_group)
+            for group_index, pattern_group in enumerate(pattern_groups):
+                confidence = self._calculate_confidence(
+                    text_lower, pattern_group, keyword_hits[(intent_type, group_index)]
+                )
                 
                 if confidence > best_confidence:
                     best_confidence = confidence
                     best_intent = intent_type
                     best_match = pattern_group
+                    # Confianza saturada: ningún grupo posterior puede superarla
+                    if confidence >= 1.0:
+                        break
+            else:
+                continue
+            break
         
         # Extraer target y detalles
         target = self._extract_target(text_lower, best_intent)
         action_details = self._extract_action_details(text_lower, best_intent, best_match)
         
-        return ParsedIntent(
-            intent=best_intent,
-            confidence=best_confidence,
-            target=target,
-            action_details=action_details,
-            original_text=text
-        )
+        return best_intent, best_confidence, target, tuple(action_details.items())
     
-    def _calculate_confidence(self, text: str, pattern_group: Dict) -> float:
-        """Calcular confianza basada en patrones y keywords"""
+    def _calculate_confidence(self, text: str, pattern_group: Dict, keyword_matches: int) -> float:
+        """Calcular confianza basada en patrones y keywords (keyword_matches: de _count_keyword_hits)"""
         confidence = 0.0
         base_confidence = pattern_group.get("confidence", 0.5)
         
         # Verificar patrones regex - dar más peso a los matches
-        pattern_matches = 0
-        for pattern in pattern_group["patterns"]:
-            if re.search(pattern, text, re.IGNORECASE):
-                pattern_matches += 1
-        
-        if pattern_matches > 0:
+        if pattern_group["compiled"].search(text):
             # Aumentar confianza por pattern match
             pattern_confidence = base_confidence * 0.8  # 80% del base por cualquier match
             confidence += pattern_confidence
         
         # Verificar keywords - más generoso
-        keyword_matches = 0
-        for keyword in pattern_group["keywords"]:
-            if keyword.lower() in text:
-                keyword_matches += 1
-        
         if keyword_matches > 0:
             # Más peso a keywords
             keyword_confidence = 0.5 * (keyword_matches / len(pattern_group["keywords"]))
@@ -203,21 +303,11 @@ class NLPParser:
     
     def _extract_target(self, text: str, intent: IntentType) -> Optional[str]:
         """Extraer objetivo/target de la intención"""
-        # Patrones comunes para targets
-        target_patterns = [
-            r"(?:archivo|file|fichero)\s+([^\s]+)",
-            r"(?:proyecto|project)\s+([^\s]+)",
-            r"(?:función|function|método|method)\s+([^\s]+)",
-            r"(?:clase|class)\s+([^\s]+)",
-            r"(?:este|esto|el|la)\s+([^\s]+)",
-            r"([^\s]+\.py)",
-            r"([^\s]+\.js)",
-            r"([^\s]+\.json)",
-            r"([^\s]+/[^\s]*)"  # Paths
-        ]
+        if not self._TARGET_ANY_RE.search(text):
+            return None
         
-        for pattern in target_patterns:
-            match = re.search(pattern, text)
+        for pattern in self._TARGET_RES:
+            match = pattern.search(text)
             if match:
                 return match.group(1)
         
@@ -225,41 +315,13 @@ class NLPParser:
     
     def _extract_action_details(self, text: str, intent: IntentType, pattern_group: Dict) -> Dict[str, Any]:
         """Extraer detalles específicos de la acción"""
-        details = {}
-        
-        # Detalles específicos por intent
-        if intent == IntentType.ANALYZE:
-            # Buscar qué tipo de análisis
-            if "problemas" in text or "errores" in text or "issues" in text:
-                details["focus"] = "issues"
-            elif "performance" in text or "rendimiento" in text:
-                details["focus"] = "performance"
-            elif "métricas" in text or "estadísticas" in text:
-                details["focus"] = "metrics"
-            else:
-                details["focus"] = "general"
-        
-        elif intent == IntentType.CREATE:
-            # Buscar tipo de archivo/proyecto
-            if "api" in text or "servidor" in text:
-                details["type"] = "api"
-            elif "web" in text or "frontend" in text:
-                details["type"] = "web"
-            elif "función" in text or "método" in text:
-                details["type"] = "function"
-            elif "clase" in text:
-                details["type"] = "class"
-        
-        elif intent == IntentType.OPTIMIZE:
-            # Buscar qué optimizar
-            if "memoria" in text:
-                details["target"] = "memory"
-            elif "velocidad" in text or "tiempo" in text:
-                details["target"] = "speed"
-            elif "cpu" in text:
-                details["target"] = "cpu"
+        # Detalles específicos por intent: gana la primera keyword (en orden) presente
+        for keyword, (key, value) in self._DETAIL_TABLE.get(intent, {}).items():
+            if keyword in text:
+                return {key: value}
         
-        return details
+        default = self._DETAIL_DEFAULTS.get(intent)
+        return {default[0]: default[1]} if default else {}
     
     def is_confident(self, parsed_intent: ParsedIntent) -> bool:
         """Verificar si la confianza es suficiente"""
@@ -279,10 +341,11 @@ class NLPParser:
         ]
         
         # Sugerencias específicas basadas en el texto
-        if "archivo" in text.lower():
+        text_lower = text.lower()
+        if "archivo" in text_lower:
             suggestions.append("Especifica el nombre del archivo o su ubicación")
         
-        if any(word in text.lower() for word in ["problema", "error", "falla"]):
+        if any(word in text_lower for word in ("problema", "error", "falla")):
             suggestions.append("Prueba: 'Analiza este proyecto y encuentra problemas'")
         
         return suggestions[:3]  # Máximo 3 sugerencias
\ No newline at end of file
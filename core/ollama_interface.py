@@ -2,14 +2,52 @@
 Interfaz de comunicación con Ollama
 """
 
-import subprocess
+import hashlib
+import http.client
 import json
+import logging
 import sys
 import platform
+import threading
 import time
-from typing import List, Dict, Any, Optional
+from itertools import chain
+from typing import List, Dict, Any, Optional, Callable, Tuple, Iterator, FrozenSet
 from monitoring.metrics import get_metrics_collector
 
+# Errores de chat(): sin handlers configurados, logging los manda a stderr
+logger = logging.getLogger('localclaude.ollama')
+
+# Prefijo fijo del prompt: va siempre primero y byte a byte idéntico para que
+# el servidor de Ollama pueda reutilizar su caché KV entre turnos
+PROMPT_PREFIX = """Eres Claude, un asistente de IA especializado en programación y análisis de código.
+Estás corriendo localmente a través de Ollama.
+
+Características:
+- Eres experto en programación, análisis de código y tareas de desarrollo
+- Puedes explorar archivos y directorios
+- Ayudas a crear, editar y analizar código
+- Respondes de manera concisa y práctica
+- Usas emojis apropiados para hacer las respuestas más claras
+
+Contexto actual: Estás en una CLI local similar a Claude Code.
+
+"""
+
+# Etiqueta de cada rol en el prompt
+_ROLE_LABELS = {'user': 'Usuario: ', 'assistant': 'Asistente: '}
+
+# API HTTP del servidor de Ollama
+OLLAMA_HOST = 'localhost'
+OLLAMA_PORT = 11434
+OLLAMA_URL = f'http://{OLLAMA_HOST}:{OLLAMA_PORT}'
+
+# Identificador del prefijo (blake2b de 64 bits), calculado una sola vez
+PROMPT_PREFIX_ID = hashlib.blake2b(PROMPT_PREFIX.encode('utf-8'), digest_size=8).hexdigest()
+
+# Prefijo ya escapado como inicio de una cadena JSON (sin la comilla de cierre):
+# el payload de cada turno solo escapa y codifica la parte variable
+_PROMPT_PREFIX_JSON = json.dumps(PROMPT_PREFIX)[:-1].encode('ascii')
+
 class OllamaInterface:
     """Interfaz para comunicarse con Ollama"""
     
@@ -17,152 +55,135 @@ class OllamaInterface:
         self.settings = settings
         self.current_model = settings.models['current']
         self.is_windows = platform.system() == 'Windows'
-        self.ollama_cmd = self._get_ollama_command()
         self.metrics = get_metrics_collector()
-    
-    def _get_ollama_command(self):
-        """Obtener comando ollama apropiado para el sistema"""
-        if self.is_windows:
-            # En Windows, intentar usar WSL si está disponible
-            try:
-                subprocess.run(['wsl', '--version'], capture_output=True, timeout=5)
-                return ['wsl', 'ollama']
-            except:
-                # Si no hay WSL, usar ollama directo (asumiendo que está instalado en Windows)
-                return ['ollama']
-        else:
-            return ['ollama']
+        
+        # Momento (monotónico) de la última interacción exitosa con Ollama
+        self._last_ok: Optional[float] = None
+        
+        # Identificador del prefijo estable del prompt
+        self.prefix_id = PROMPT_PREFIX_ID
+        
+        # Último resultado de la prueba de conexión: (momento, ok)
+        self.probe_ttl = 10.0  # segundos
+        self._conn_state: Optional[Tuple[float, bool]] = None
+        
+        # Última lista de modelos: (momento, nombres); también vale para test_model
+        self._models_cache: Optional[Tuple[float, FrozenSet[str], List[str]]] = None
+        
+        # Conexión HTTP persistente con el servidor (se abre en la primera petición)
+        self._http: Optional[http.client.HTTPConnection] = None
     
     def test_connection(self) -> bool:
-        """Probar conexión con Ollama"""
-        try:
-            # Primero probar el comando básico
-            result = subprocess.run(
-                self.ollama_cmd + ['list'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            if result.returncode != 0:
-                return False
-                
-            # Luego verificar el API
-            import urllib.request
-            api_urls = ['http://localhost:11434/api/tags']
-            
-            # En Windows con WSL, también probar la IP de WSL
-            if self.is_windows:
-                try:
-                    # Obtener IP de WSL
-                    wsl_result = subprocess.run(['wsl', 'ip', 'route', 'show'], 
-                                              capture_output=True, text=True, timeout=5)
-                    # Parsear IP de WSL (esto es una simplificación)
-                    api_urls.append('http://172.17.0.1:11434/api/tags')  # IP común de WSL
-                except:
-                    pass
-            
-            for url in api_urls:
-                try:
-                    urllib.request.urlopen(url, timeout=5)
-                    return True
-                except:
-                    continue
-                    
-            # Si el API no responde, pero ollama list funciona, aún es válido
+        """Probar conexión con Ollama (reutiliza el resultado durante probe_ttl)"""
+        if self.is_recently_connected(self.probe_ttl):
             return True
-                
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+        
+        if self._conn_state is not None and time.monotonic() - self._conn_state[0] < self.probe_ttl:
+            return self._conn_state[1]
+        
+        ok = self._probe_connection()
+        self._conn_state = (time.monotonic(), ok)
+        return ok
+    
+    def _probe_connection(self) -> bool:
+        """Comprobar realmente la conexión con Ollama (API HTTP)"""
+        if self._get_json('/api/tags', timeout=1.0) is None:
             return False
+        
+        self._last_ok = time.monotonic()
+        return True
     
-    def test_model(self, model_name: str) -> bool:
-        """Probar si un modelo específico funciona"""
-        try:
-            # Verificar primero que el modelo esté en la lista
-            result = subprocess.run(
-                self.ollama_cmd + ['list'],
-                capture_output=True,
-                text=True,
-                timeout=10
+    def warm_model(self, model_name: str = None):
+        """
+        Cargar el modelo en el servidor de Ollama en segundo plano
+        
+        Una petición sin prompt a /api/generate solo carga el modelo en memoria,
+        así que el primer turno no paga la carga en frío. Falla en silencio.
+        """
+        if model_name is None:
+            model_name = self.current_model
+        
+        def _warm():
+            import urllib.request
+            request = urllib.request.Request(
+                f'{OLLAMA_URL}/api/generate',
+                data=json.dumps({'model': model_name}).encode('utf-8'),
+                headers={'Content-Type': 'application/json'}
             )
-            
-            if result.returncode != 0:
-                return False
-                
-            # Buscar el modelo en la lista
-            if model_name not in result.stdout:
-                return False
-                
-            # Si está en la lista, asumimos que funciona
-            # (evitamos el test real que es muy lento con deepseek-r1)
+            try:
+                urllib.request.urlopen(request, timeout=60).read()
+            except Exception:
+                pass
+        
+        threading.Thread(target=_warm, name='ollama-warmup', daemon=True).start()
+    
+    def is_recently_connected(self, max_age: float = 10.0) -> bool:
+        """Verificar si hubo una interacción exitosa en los últimos max_age segundos"""
+        return self._last_ok is not None and time.monotonic() - self._last_ok < max_age
+    
+    def test_model(self, model_name: str) -> bool:
+        """Probar si un modelo específico funciona (según la lista cacheada de modelos)"""
+        # Si está en la lista, asumimos que funciona
+        # (evitamos el test real que es muy lento con deepseek-r1)
+        names = self._list_models()[0]
+        if model_name in names or f"{model_name}:latest" in names:
             return True
-            
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
-            return False
+        # Nombre sin etiqueta ("qwen2.5-coder" para "qwen2.5-coder:7b")
+        return any(name.split(':')[0] == model_name for name in names)
     
-    def chat(self, messages: List[Dict[str, str]], model_name: str = None, task_type: str = None) -> Optional[str]:
+    def chat(self, messages: List[Dict[str, str]], model_name: str = None, task_type: str = None,
+             stream_callback: Optional[Callable[[str], None]] = None) -> Optional[str]:
         """
         Enviar mensajes a Ollama y obtener respuesta
         
         Args:
             messages: Lista de mensajes en formato [{'role': 'user/assistant', 'content': '...'}]
             model_name: Nombre del modelo a usar (opcional)
+            stream_callback: Función llamada con cada fragmento de texto según llega (opcional)
         
         Returns:
             Respuesta del modelo o None si hay error
         """
         start_time = time.time()
-        
-        if model_name is None:
-            # 🧠 SMART MODEL SWITCHING
-            if task_type:
-                from config.settings import Settings
-                settings = Settings()
-                model_name = settings.get_optimal_model(task_type)
-            else:
-                model_name = self.current_model
+        model_name = self._resolve_model(model_name, task_type)
         
         try:
-            # Preparar el prompt final
-            prompt = self._format_messages_for_ollama(messages)
-            
-            # Ejecutar ollama
-            result = subprocess.run(
-                self.ollama_cmd + ['run', model_name, prompt],
-                capture_output=True,
-                text=True,
-                timeout=60  # 1 minuto timeout - más rápido
-            )
+            chunks = []
+            for text in self.chat_stream(messages, model_name):
+                chunks.append(text)
+                if stream_callback is not None:
+                    stream_callback(text)
             
             # Calcular tiempo de respuesta
             response_time = time.time() - start_time
             
-            if result.returncode == 0:
-                # Registrar métricas de éxito
-                self.metrics.log_model_usage(model_name, task_type or 'unknown', response_time)
-                return result.stdout.strip()
-            else:
-                # Registrar error
-                self.metrics.log_error('ollama_execution', result.stderr, {
-                    'model': model_name,
-                    'task_type': task_type
-                })
-                print(f"❌ Error de Ollama: {result.stderr}")
-                return None
+            # Registrar métricas de éxito
+            self.metrics.log_model_usage(model_name, task_type or 'unknown', response_time)
+            return "".join(chunks).strip()
                 
-        except subprocess.TimeoutExpired:
+        except RuntimeError as e:
+            # Error devuelto por Ollama
+            self.metrics.log_error('ollama_execution', str(e), {
+                'model': model_name,
+                'task_type': task_type,
+                'prefix_id': self.prefix_id
+            })
+            logger.error("Error de Ollama: %s", e)
+            return None
+        except TimeoutError:
             response_time = time.time() - start_time
             self.metrics.log_error('ollama_timeout', f"Timeout después de {response_time:.1f}s", {
                 'model': model_name,
                 'task_type': task_type
             })
-            print("❌ Timeout: El modelo tardó demasiado en responder")
+            logger.error("Timeout: El modelo tardó demasiado en responder")
             return None
-        except FileNotFoundError:
-            self.metrics.log_error('ollama_not_found', "Ollama no encontrado", {
+        except ConnectionError:
+            self.metrics.log_error('ollama_not_found', "Ollama no responde", {
                 'model': model_name,
                 'task_type': task_type
             })
-            print("❌ Ollama no encontrado. Asegúrate de que esté instalado y en el PATH")
+            logger.error("No se pudo conectar con Ollama en %s. Asegúrate de que esté corriendo (ollama serve)", OLLAMA_URL)
             return None
         except Exception as e:
             response_time = time.time() - start_time
@@ -171,72 +192,168 @@ class OllamaInterface:
                 'task_type': task_type,
                 'response_time': response_time
             })
-            print(f"❌ Error inesperado: {e}")
+            logger.error("Error inesperado: %s", e)
             return None
     
-    def _format_messages_for_ollama(self, messages: List[Dict[str, str]]) -> str:
+    def chat_stream(self, messages: List[Dict[str, str]], model_name: str = None,
+                    task_type: str = None) -> Iterator[str]:
         """
-        Formatear mensajes para Ollama
+        Enviar mensajes a Ollama y producir la respuesta por fragmentos según llega
         
-        Ollama no maneja el formato de mensajes estructurados como OpenAI,
-        así que convertimos a un prompt simple
+        A diferencia de chat(), no registra métricas ni captura errores: un error
+        de Ollama se lanza como RuntimeError y los de red como OSError.
         """
-        system_prompt = """Eres Claude, un asistente de IA especializado en programación y análisis de código.
-Estás corriendo localmente a través de Ollama.
-
-Características:
-- Eres experto en programación, análisis de código y tareas de desarrollo
-- Puedes explorar archivos y directorios
-- Ayudas a crear, editar y analizar código
-- Respondes de manera concisa y práctica
-- Usas emojis apropiados para hacer las respuestas más claras
-
-Contexto actual: Estás en una CLI local similar a Claude Code."""
+        model_name = self._resolve_model(model_name, task_type)
+        
+        payload = self._build_generate_payload(model_name, messages)
+        response = self._request('POST', '/api/generate', payload, timeout=60)
         
-        # Construir prompt
-        prompt_parts = [system_prompt, "\n\n"]
+        if response.status != 200:
+            raise RuntimeError(self._read_error(response))
         
-        for message in messages:
-            role = message['role']
-            content = message['content']
+        try:
+            # Una línea JSON por fragmento
+            for line in response:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if 'error' in chunk:
+                    raise RuntimeError(chunk['error'])
+                text = chunk.get('response', '')
+                if text:
+                    yield text
+                if chunk.get('done'):
+                    break
             
-            if role == 'user':
-                prompt_parts.append(f"Usuario: {content}\n")
-            elif role == 'assistant':
-                prompt_parts.append(f"Asistente: {content}\n")
+            # Consumir el resto para poder reutilizar la conexión
+            response.read()
+            self._last_ok = time.monotonic()
+        except BaseException:
+            # Respuesta a medias (error o consumidor que abandona): no reutilizable
+            self._close_http()
+            raise
+    
+    def _resolve_model(self, model_name: Optional[str], task_type: Optional[str]) -> str:
+        """Elegir el modelo: el indicado, el óptimo para task_type o el actual"""
+        if model_name is not None:
+            return model_name
         
-        prompt_parts.append("Asistente: ")
+        # 🧠 SMART MODEL SWITCHING
+        if task_type:
+            from config.settings import Settings
+            settings = Settings()
+            return settings.get_optimal_model(task_type)
+        return self.current_model
+    
+    def _request(self, method: str, path: str, body: Optional[bytes] = None,
+                 timeout: float = 10.0) -> http.client.HTTPResponse:
+        """
+        Petición al API de Ollama reutilizando la conexión (keep-alive)
         
-        return "".join(prompt_parts)
+        La respuesta debe leerse completa antes de la siguiente petición.
+        """
+        for attempt in range(2):
+            if self._http is None:
+                self._http = http.client.HTTPConnection(OLLAMA_HOST, OLLAMA_PORT, timeout=timeout)
+            elif self._http.sock is not None:
+                self._http.sock.settimeout(timeout)
+            else:
+                self._http.timeout = timeout
+            
+            try:
+                self._http.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+                return self._http.getresponse()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # El servidor cerró la conexión inactiva: reintentar una vez con una nueva
+                self._close_http()
+                if attempt:
+                    raise
+            except Exception:
+                self._close_http()
+                raise
     
-    def get_available_models(self) -> List[str]:
-        """Obtener lista de modelos disponibles"""
+    def _close_http(self):
+        """Descartar la conexión HTTP actual"""
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+    
+    def _get_json(self, path: str, timeout: float = 10.0) -> Optional[Dict[str, Any]]:
+        """GET al API de Ollama; None si no responde o devuelve error"""
         try:
-            result = subprocess.run(
-                self.ollama_cmd + ['list'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')[1:]  # Saltar header
-                models = []
-                for line in lines:
-                    if line.strip():
-                        model_name = line.split()[0]
-                        models.append(model_name)
-                return models
-            else:
-                return []
-                
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
-            return []
+            response = self._request('GET', path, timeout=timeout)
+            body = response.read()
+            if response.status != 200:
+                return None
+            return json.loads(body)
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _read_error(response: http.client.HTTPResponse) -> str:
+        """Extraer el mensaje de error de una respuesta fallida"""
+        body = response.read()
+        try:
+            return json.loads(body)['error']
+        except (ValueError, KeyError, TypeError):
+            return body.decode('utf-8', errors='replace') or f"HTTP {response.status}"
+    
+    def _format_messages_for_ollama(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Formatear mensajes para Ollama
+        
+        Ollama no maneja el formato de mensajes estructurados como OpenAI,
+        así que convertimos a un prompt simple. El prefijo fijo va siempre
+        primero; todo lo que varía por turno va detrás.
+        """
+        return PROMPT_PREFIX + self._format_conversation(messages)
+    
+    @staticmethod
+    def _format_conversation(messages: List[Dict[str, str]]) -> str:
+        """Parte variable del prompt: los turnos y la etiqueta de respuesta"""
+        # Los roles sin etiqueta, como 'system', no se incluyen
+        return "".join(chain(
+            (f"{_ROLE_LABELS[message['role']]}{message['content']}\n"
+             for message in messages if message['role'] in _ROLE_LABELS),
+            ("Asistente: ",)
+        ))
+    
+    def _build_generate_payload(self, model_name: str, messages: List[Dict[str, str]]) -> bytes:
+        """
+        Cuerpo JSON de /api/generate, directamente en bytes
+        
+        Equivale a json.dumps({'model', 'prompt', 'stream': True}) con el prompt
+        de _format_messages_for_ollama, pero el prefijo fijo ya va escapado y
+        codificado. La salida de json.dumps es ASCII (ensure_ascii).
+        """
+        return b"".join((
+            b'{"model": ', json.dumps(model_name).encode('ascii'),
+            b', "prompt": ', _PROMPT_PREFIX_JSON,
+            json.dumps(self._format_conversation(messages))[1:].encode('ascii'),
+            b', "stream": true}'
+        ))
+    
+    def get_available_models(self) -> List[str]:
+        """Obtener lista de modelos disponibles (reutiliza el resultado durante probe_ttl)"""
+        return list(self._list_models()[1])
+    
+    def _list_models(self) -> Tuple[FrozenSet[str], List[str]]:
+        """Nombres de los modelos instalados, como conjunto y como lista ordenada"""
+        cached = self._models_cache
+        if cached is not None and time.monotonic() - cached[0] < self.probe_ttl:
+            return cached[1], cached[2]
+        
+        data = self._get_json('/api/tags')
+        models = [model['name'] for model in data.get('models', [])] if data is not None else []
+        self._models_cache = (time.monotonic(), frozenset(models), models)
+        return self._models_cache[1], models
     
     def switch_model(self, model_name: str) -> bool:
         """Cambiar modelo actual"""
         if self.test_model(model_name):
             self.current_model = model_name
+            # La próxima consulta vuelve a pedir la lista al servidor
+            self._models_cache = None
             return True
         return False
     
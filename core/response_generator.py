@@ -3,18 +3,69 @@ Response Generator para formatear respuestas naturales y sugerencias
 """
 
 import re
+import sys
 import time
-from typing import Dict, List, Optional, Any
+from itertools import chain
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from core.nlp_parser import ParsedIntent, IntentType
 
 
-@dataclass
+# Una línea a mejorar en _improve_formatting, con el '\n' que la precede (el
+# literal inicial deja al motor saltar de línea en línea) y sin los espacios
+# de los extremos:
+# - item: lista simple ("-" o "*"), con el texto del elemento
+# - title: título, línea de menos de 50 caracteres con ':' que no acaba en '.'
+_FORMAT_LINE_RE = re.compile(
+    r'\n[^\S\n]*(?:'
+    r'[-*][^\S\n]*(?P<item>[^\n]*?)'
+    r'|(?P<title>(?=[^\n]*:)\S(?:[^\n]{0,47}\S)?(?<!\.))'
+    r')[^\S\n]*(?![^\n])'
+)
+
+
+def _format_line(match: re.Match) -> str:
+    """Reemplazo de una línea detectada por _FORMAT_LINE_RE"""
+    item = match.group('item')
+    if item is not None:
+        return f"\n• {item}"
+    return f"\n**{match.group('title')}**"
+
+
+# Niveles de confianza: siempre estos mismos objetos, así que comparar con
+# == se resuelve por identidad sin recorrer los caracteres
+CONFIDENCE_HIGH = sys.intern("high")
+CONFIDENCE_MEDIUM = sys.intern("medium")
+CONFIDENCE_LOW = sys.intern("low")
+
+
+# Bloques fijos de la presentación (cada uno va en su propia línea)
+_FOLLOW_UP_HEADER = "\n🤔 **Preguntas de seguimiento:**"
+_SUGGESTIONS_HEADER = "\n💡 **Sugerencias:**"
+_LOW_CONFIDENCE_FOOTER = "\n⚠️ *Si necesitas algo diferente, intenta ser más específico*"
+
+
+# Tipo de respuesta según quién manejó la solicitud (cualquier otro: "error")
+_HANDLED_BY_MAP = {
+    "direct": "direct_action",
+    "tools": "tool_response",
+    "llm": "llm_response"
+}
+
+
+# Frases que identifican el tipo de error, por prioridad (gana la primera presente)
+_ERROR_PHRASES = (
+    ("no pude entender", "parsing_error"),
+    ("herramientas", "tool_error"),
+)
+
+
+@dataclass(slots=True, frozen=True)
 class ResponseMetadata:
-    """Metadatos de respuesta generada"""
+    """Metadatos de respuesta generada (inmutables una vez creados)"""
     generation_time: float
     suggested_actions: List[str]
-    confidence_level: str  # "high", "medium", "low"
+    confidence_level: str  # CONFIDENCE_HIGH, CONFIDENCE_MEDIUM o CONFIDENCE_LOW
     follow_up_questions: List[str]
     proactive_suggestions: List[str]
 
@@ -22,9 +73,21 @@ class ResponseMetadata:
 class ResponseGenerator:
     """Generador de respuestas naturales y sugerencias proactivas"""
     
+    # Continuación por (tarea actual, intent): plantilla y objetivo por defecto;
+    # solo se formatea la que corresponde
+    _TASK_INTENT_MAP = {
+        ("analyze", IntentType.CREATE): ("Crear solución para {}", "el problema"),
+        ("analyze", IntentType.OPTIMIZE): ("Optimizar {}", "lo analizado"),
+        ("create", IntentType.ANALYZE): ("Analizar calidad de {}", "lo creado"),
+        ("create", IntentType.TEST): ("Crear tests para {}", "lo desarrollado"),
+        ("optimize", IntentType.ANALYZE): ("Verificar mejoras en {}", "lo optimizado")
+    }
+    
     def __init__(self):
         self.response_templates = self._load_response_templates()
         self.suggestion_patterns = self._load_suggestion_patterns()
+        self._suggestion_index = self._build_suggestion_index()
+        self._prefix_cache = self._build_prefix_cache()
     
     def _load_response_templates(self) -> Dict[str, Dict]:
         """Cargar plantillas de respuesta para diferentes contextos"""
@@ -77,6 +140,24 @@ class ResponseGenerator:
             }
         }
     
+    def _build_prefix_cache(self) -> Dict[tuple, str]:
+        """
+        Prefijo ya resuelto (primera plantilla) por (tipo de respuesta, subtipo):
+        tipo de error para "error", intent para "direct_action" y None para el resto
+        """
+        cache = {}
+        for error_type, templates in self.response_templates["error"].items():
+            cache[("error", error_type)] = templates[0]
+        
+        success = self.response_templates["success"]
+        for intent_type in IntentType:
+            cache[("direct_action", intent_type)] = success["direct_action"][0].format(
+                action=intent_type.value.title()
+            )
+        cache[("tool_response", None)] = success["tool_response"][0]
+        cache[("llm_response", None)] = success["llm_response"][0]
+        return cache
+    
     def _load_suggestion_patterns(self) -> Dict[IntentType, Dict]:
         """Cargar patrones de sugerencias por tipo de intent"""
         return {
@@ -142,6 +223,16 @@ class ResponseGenerator:
             }
         }
     
+    def _build_suggestion_index(self) -> Dict[IntentType, Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+        """Por intent, las sugerencias que se muestran (follow_up, proactive), ya recortadas a 2"""
+        return {
+            intent_type: (
+                tuple(patterns.get("follow_up", [])[:2]),
+                tuple(patterns.get("proactive", [])[:2])
+            )
+            for intent_type, patterns in self.suggestion_patterns.items()
+        }
+    
     def generate_response(
         self, 
         raw_response: str,
@@ -188,16 +279,7 @@ class ResponseGenerator:
         if not execution_metadata.get("success", False):
             return "error"
         
-        handled_by = execution_metadata.get("handled_by", "unknown")
-        
-        if handled_by == "direct":
-            return "direct_action"
-        elif handled_by == "tools":
-            return "tool_response"
-        elif handled_by == "llm":
-            return "llm_response"
-        else:
-            return "error"
+        return _HANDLED_BY_MAP.get(execution_metadata.get("handled_by"), "error")
     
     def _format_main_response(
         self, 
@@ -210,45 +292,32 @@ class ResponseGenerator:
         
         # Si es error, usar plantillas de error
         if response_type == "error" or not execution_metadata.get("success", False):
-            error_type = self._classify_error(execution_metadata)
-            templates = self.response_templates["error"][error_type]
-            prefix = templates[0]  # Usar primera plantilla
-            
-            return f"{prefix}\n\n{raw_response}"
-        
-        # Para respuestas exitosas
-        if response_type == "direct_action":
-            action = intent.intent.value.title()
-            templates = self.response_templates["success"]["direct_action"]
-            prefix = templates[0].format(action=action)
-            
-            return f"{prefix}\n\n{raw_response}"
-        
-        elif response_type == "tool_response":
-            templates = self.response_templates["success"]["tool_response"]
-            prefix = templates[0]
-            
-            return f"{prefix}\n\n{raw_response}"
+            key = ("error", self._classify_error(execution_metadata))
+        # Para respuestas exitosas (la acción directa lleva el intent en el prefijo)
+        elif response_type == "direct_action":
+            key = (response_type, intent.intent)
+        else:
+            key = (response_type, None)
         
-        elif response_type == "llm_response":
-            templates = self.response_templates["success"]["llm_response"]
-            prefix = templates[0]
-            
-            # Para respuestas LLM, ser más natural
-            return f"{prefix}\n\n{raw_response}"
+        prefix = self._prefix_cache.get(key)
+        if prefix is None:
+            return raw_response
         
-        return raw_response
+        return f"{prefix}\n\n{raw_response}"
     
     def _classify_error(self, execution_metadata: Dict[str, Any]) -> str:
         """Clasificar tipo de error"""
-        error_response = execution_metadata.get("response", "")
-        
-        if "no pude entender" in error_response.lower():
-            return "parsing_error"
-        elif "herramientas" in error_response.lower():
-            return "tool_error"
-        else:
+        error_response = execution_metadata.get("response")
+        if not error_response:
             return "execution_error"
+        
+        # Una sola copia en minúsculas para todas las frases
+        lowered = error_response.lower()
+        for phrase, error_type in _ERROR_PHRASES:
+            if phrase in lowered:
+                return error_type
+        
+        return "execution_error"
     
     def _generate_suggestions(
         self, 
@@ -266,10 +335,10 @@ class ResponseGenerator:
         }
         
         # Sugerencias específicas por intent
-        if intent.intent in self.suggestion_patterns:
-            patterns = self.suggestion_patterns[intent.intent]
-            suggestions["follow_up"] = patterns.get("follow_up", [])[:2]
-            suggestions["proactive"] = patterns.get("proactive", [])[:2]
+        indexed = self._suggestion_index.get(intent.intent)
+        if indexed is not None:
+            suggestions["follow_up"] = list(indexed[0])
+            suggestions["proactive"] = list(indexed[1])
         
         # Sugerencias basadas en contexto de conversación
         if conversation_context:
@@ -333,17 +402,10 @@ class ResponseGenerator:
             return suggestions
         
         # Sugerencias específicas por combinación task + intent
-        task_intent_map = {
-            ("analyze", IntentType.CREATE): f"Crear solución para {current_target or 'el problema'}",
-            ("analyze", IntentType.OPTIMIZE): f"Optimizar {current_target or 'lo analizado'}",
-            ("create", IntentType.ANALYZE): f"Analizar calidad de {current_target or 'lo creado'}",
-            ("create", IntentType.TEST): f"Crear tests para {current_target or 'lo desarrollado'}",
-            ("optimize", IntentType.ANALYZE): f"Verificar mejoras en {current_target or 'lo optimizado'}"
-        }
-        
-        key = (current_task, intent.intent)
-        if key in task_intent_map:
-            suggestions.append(task_intent_map[key])
+        entry = self._TASK_INTENT_MAP.get((current_task, intent.intent))
+        if entry is not None:
+            template, default_target = entry
+            suggestions.append(template.format(current_target or default_target))
         
         return suggestions
     
@@ -379,11 +441,11 @@ class ResponseGenerator:
         
         # Clasificar
         if score >= 0.8:
-            return "high"
+            return CONFIDENCE_HIGH
         elif score >= 0.6:
-            return "medium"
+            return CONFIDENCE_MEDIUM
         else:
-            return "low"
+            return CONFIDENCE_LOW
     
     def _create_presentation(
         self, 
@@ -391,24 +453,18 @@ class ResponseGenerator:
         metadata: ResponseMetadata
     ) -> str:
         """Crear presentación final para mostrar al usuario"""
-        presentation_parts = [formatted_response]
-        
-        # Agregar sugerencias si hay
-        if metadata.follow_up_questions:
-            presentation_parts.append("\n🤔 **Preguntas de seguimiento:**")
-            for question in metadata.follow_up_questions:
-                presentation_parts.append(f"• {question}")
-        
-        if metadata.suggested_actions:
-            presentation_parts.append("\n💡 **Sugerencias:**")
-            for action in metadata.suggested_actions:
-                presentation_parts.append(f"• {action}")
-        
-        # Agregar indicador de confianza si es bajo
-        if metadata.confidence_level == "low":
-            presentation_parts.append("\n⚠️ *Si necesitas algo diferente, intenta ser más específico*")
-        
-        return "\n".join(presentation_parts)
+        follow_up = metadata.follow_up_questions
+        actions = metadata.suggested_actions
+        
+        # Una sola pasada: respuesta, sugerencias (si hay) e indicador de confianza baja
+        return "\n".join(chain(
+            (formatted_response,),
+            (_FOLLOW_UP_HEADER,) if follow_up else (),
+            (f"• {question}" for question in follow_up),
+            (_SUGGESTIONS_HEADER,) if actions else (),
+            (f"• {action}" for action in actions),
+            (_LOW_CONFIDENCE_FOOTER,) if metadata.confidence_level == CONFIDENCE_LOW else ()
+        ))
     
     def create_error_response(
         self, 
@@ -424,17 +480,16 @@ class ResponseGenerator:
                 "Usa 'ayuda' para ver opciones disponibles"
             ]
         
-        formatted_response = f"❌ **Error**: {error_message}"
-        
-        if suggestions:
-            formatted_response += "\n\n💡 **Sugerencias:**"
-            for suggestion in suggestions:
-                formatted_response += f"\n• {suggestion}"
+        formatted_response = "\n".join(chain(
+            (f"❌ **Error**: {error_message}",),
+            (_SUGGESTIONS_HEADER,) if suggestions else (),
+            (f"• {suggestion}" for suggestion in suggestions)
+        ))
         
         metadata = ResponseMetadata(
             generation_time=0.0,
             suggested_actions=suggestions,
-            confidence_level="low",
+            confidence_level=CONFIDENCE_LOW,
             follow_up_questions=[],
             proactive_suggestions=[]
         )
@@ -470,20 +525,6 @@ class ResponseGenerator:
     
     def _improve_formatting(self, text: str) -> str:
         """Mejorar formato de texto agregando iconos y estructura"""
-        # Detectar listas y mejorarlas
-        lines = text.split('\n')
-        improved_lines = []
-        
-        for line in lines:
-            stripped = line.strip()
-            
-            # Mejorar listas simples
-            if stripped.startswith('-') or stripped.startswith('*'):
-                improved_lines.append(f"• {stripped[1:].strip()}")
-            # Detectar títulos (líneas cortas seguidas de contenido)
-            elif len(stripped) < 50 and ':' in stripped and not stripped.endswith('.'):
-                improved_lines.append(f"**{stripped}**")
-            else:
-                improved_lines.append(line)
-        
-        return '\n'.join(improved_lines)
\ No newline at end of file
+        # Listas simples -> "•" y títulos cortos -> negrita; el resto de líneas
+        # se recorre dentro del motor de regex sin tocarlas
+        return _FORMAT_LINE_RE.sub(_format_line, '\n' + text)[1:]
\ No newline at end of file
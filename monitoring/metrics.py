@@ -4,16 +4,49 @@ Core del sistema de métricas - Logging silencioso
 
 import time
 import json
+import functools
+import queue
+import atexit
 import sqlite3
 import threading
 from datetime import datetime, timedelta
+from collections import Counter
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 import logging
+from logging.handlers import QueueHandler, QueueListener
+
+
+# Marca de fin para el hilo escritor
+_STOP = object()
+
+
+@functools.lru_cache(maxsize=512)
+def _serialize_items(items: tuple, types: tuple) -> str:
+    """JSON de unos metadatos dados como tupla de items (types: distingue True de 1)"""
+    return json.dumps(dict(items))
+
+
+def _serialize_metadata(metadata: Dict) -> str:
+    """
+    Serializar metadatos de una métrica
+    
+    Casi siempre se repiten las mismas pocas formas ({'cache_type': ...},
+    {'command': ..., 'success': ...}), así que se cachean; los que tienen
+    valores no hashables (p. ej. el contexto de un error) se serializan siempre.
+    """
+    try:
+        return _serialize_items(tuple(metadata.items()), tuple(map(type, metadata.values())))
+    except TypeError:
+        return json.dumps(metadata)
+
 
 class MetricsCollector:
     """Recolector silencioso de métricas del sistema"""
     
+    # Espera máxima de flush/close (segundos): salir nunca se cuelga por las métricas
+    shutdown_timeout = 5.0
+    
     def __init__(self, data_dir: str = "data"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
@@ -23,7 +56,8 @@ class MetricsCollector:
         self.current_metrics_path = self.data_dir / "metrics_current.json"
         
         # Estado en memoria para session actual
-        self.session_start = datetime.now()
+        self.session_start = datetime.now()  # Para mostrar
+        self._session_start_mono = time.monotonic()  # Para medir la duración
         self.session_metrics = {
             'commands_executed': 0,
             'models_used': {},
@@ -36,11 +70,38 @@ class MetricsCollector:
         # Thread-safe logging
         self._lock = threading.Lock()
         
+        # Resumen de sesión (sin la duración), invalidado por cada log_*
+        self._summary_cache: Optional[Dict[str, Any]] = None
+        
+        # Métricas pendientes de persistir: un hilo escritor las inserta en lote
+        # (cada flush_interval segundos o flush_batch_size filas)
+        self._write_queue: queue.Queue = queue.Queue()
+        self.command_counters: Counter = Counter()  # Comandos rápidos sin medir
+        self.flush_batch_size = 100
+        self.flush_interval = 0.2  # segundos
+        self._closed = False
+        
         # Configurar logging
         self._setup_logging()
         
+        # Una sola conexión para toda la vida del collector: la crea este hilo,
+        # pero tras _init_database solo la usa el hilo escritor
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        
         # Inicializar DB
         self._init_database()
+        
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            name='metrics-writer',
+            daemon=True
+        )
+        self._writer.start()
+        
+        # No perder métricas ni líneas de log pendientes al salir
+        atexit.register(self.close)
     
     def _setup_logging(self):
         """Configurar logging silencioso"""
@@ -60,14 +121,27 @@ class MetricsCollector:
         )
         handler.setFormatter(formatter)
         
-        self.logger.addHandler(handler)
+        # El logger solo encola; un hilo de QueueListener escribe en el archivo
+        log_queue = queue.SimpleQueue()
+        self._log_listener = QueueListener(log_queue, handler)
+        self._log_listener.start()
+        
+        # El logger es compartido: quitar el handler de un collector anterior
+        # para no escribir cada línea una vez por collector creado
+        for previous in list(self.logger.handlers):
+            if getattr(previous, '_metrics_handler', False):
+                self.logger.removeHandler(previous)
+        
+        self._log_handler = QueueHandler(log_queue)
+        self._log_handler._metrics_handler = True
+        self.logger.addHandler(self._log_handler)
         
         # No propagar al root logger (silencioso)
         self.logger.propagate = False
     
     def _init_database(self):
         """Inicializar base de datos SQLite"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._conn as conn:
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS metrics (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -93,6 +167,7 @@ class MetricsCollector:
     def log_command(self, command: str, execution_time: float, success: bool = True):
         """Registrar ejecución de comando"""
         with self._lock:
+            self._summary_cache = None
             self.session_metrics['commands_executed'] += 1
             self.session_metrics['total_response_time'] += execution_time
             
@@ -108,9 +183,17 @@ class MetricsCollector:
                 'success': success
             })
     
+    def count_command(self, command: str):
+        """Contar un comando rápido sin medir tiempo ni escribir en el log"""
+        with self._lock:
+            self._summary_cache = None
+            self.session_metrics['commands_executed'] += 1
+            self.command_counters[command] += 1
+    
     def log_model_usage(self, model_name: str, task_type: str, response_time: float):
         """Registrar uso de modelo"""
         with self._lock:
+            self._summary_cache = None
             if model_name not in self.session_metrics['models_used']:
                 self.session_metrics['models_used'][model_name] = 0
             self.session_metrics['models_used'][model_name] += 1
@@ -125,6 +208,7 @@ class MetricsCollector:
     def log_cache_hit(self, cache_type: str, hit: bool):
         """Registrar cache hit/miss"""
         with self._lock:
+            self._summary_cache = None
             if hit:
                 self.session_metrics['cache_hits'] += 1
             else:
@@ -139,6 +223,7 @@ class MetricsCollector:
     def log_error(self, error_type: str, error_message: str, context: Dict = None):
         """Registrar error"""
         with self._lock:
+            self._summary_cache = None
             self.session_metrics['errors_count'] += 1
             
             self.logger.error(f"ERROR:{error_type}|MSG:{error_message}")
@@ -149,50 +234,142 @@ class MetricsCollector:
             })
     
     def _store_metric(self, metric_type: str, metric_name: str, value: float, metadata: Dict = None):
-        """Almacenar métrica en DB"""
-        try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute('''
-                    INSERT INTO metrics (metric_type, metric_name, value, metadata)
-                    VALUES (?, ?, ?, ?)
-                ''', (metric_type, metric_name, value, json.dumps(metadata or {})))
-        except Exception as e:
-            # Fallo silencioso en logging
-            pass
+        """Encolar métrica para el hilo escritor (se llama con self._lock tomado)"""
+        # Timestamp explícito (mismo formato que CURRENT_TIMESTAMP): la
+        # inserción real ocurre más tarde
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        self._write_queue.put((timestamp, metric_type, metric_name, value, _serialize_metadata(metadata or {})))
+        self._queue_command_counters()
     
-    def get_session_summary(self) -> Dict[str, Any]:
-        """Obtener resumen de sesión actual"""
-        with self._lock:
-            avg_time = (self.session_metrics['total_response_time'] / 
-                       max(1, self.session_metrics['commands_executed']))
+    def _queue_command_counters(self):
+        """Encolar los contadores de comandos rápidos, una fila por comando (con self._lock tomado)"""
+        if not self.command_counters:
+            return
+        
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        for command, count in self.command_counters.items():
+            self._write_queue.put(
+                (timestamp, 'performance', 'command_count', count, _serialize_metadata({'command': command}))
+            )
+        self.command_counters.clear()
+    
+    def _writer_loop(self):
+        """
+        Bucle del hilo escritor: agrupar métricas e insertarlas en una transacción
+        
+        En la cola, además de filas, llegan Events de flush (se marcan cuando
+        todo lo anterior está escrito) y _STOP, que termina el hilo.
+        """
+        stopping = False
+        while not stopping:
+            pending = [self._write_queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            
+            while len(pending) < self.flush_batch_size and isinstance(pending[-1], tuple):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._write_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
             
-            cache_total = self.session_metrics['cache_hits'] + self.session_metrics['cache_misses']
-            hit_rate = (self.session_metrics['cache_hits'] / max(1, cache_total)) * 100
+            batch = [item for item in pending if isinstance(item, tuple)]
+            if batch:
+                try:
+                    with self._conn as conn:
+                        conn.executemany('''
+                            INSERT INTO metrics (timestamp, metric_type, metric_name, value, metadata)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', batch)
+                except sqlite3.Error:
+                    # Fallo silencioso en logging
+                    pass
             
-            return {
-                'session_duration': (datetime.now() - self.session_start).total_seconds(),
-                'commands_executed': self.session_metrics['commands_executed'],
-                'avg_response_time': avg_time,
-                'models_used': self.session_metrics['models_used'],
-                'errors_count': self.session_metrics['errors_count'],
-                'cache_hit_rate': hit_rate
-            }
+            for item in pending:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    item.set()
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Esperar a que se persistan las métricas pendientes
+        
+        Returns:
+            True si se escribieron antes de timeout (por defecto shutdown_timeout)
+        """
+        if not self._writer.is_alive():
+            return False
+        
+        done = threading.Event()
+        with self._lock:
+            self._queue_command_counters()
+            self._write_queue.put(done)
+        return done.wait(self.shutdown_timeout if timeout is None else timeout)
+    
+    def close(self):
+        """Persistir las métricas pendientes y liberar hilos, conexión y handler del log (idempotente)"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue_command_counters()
+            self._write_queue.put(_STOP)
+        
+        self._writer.join(self.shutdown_timeout)
+        if not self._writer.is_alive():
+            # Solo si el escritor terminó: si no, aún podría estar usándola
+            self._conn.close()
+        
+        self.logger.removeHandler(self._log_handler)
+        self._log_listener.stop()
+        atexit.unregister(self.close)
+    
+    def get_session_summary(self) -> Dict[str, Any]:
+        """Obtener resumen de sesión actual (solo se recalcula si hubo nuevas métricas)"""
+        with self._lock:
+            if self._summary_cache is None:
+                self._summary_cache = self._build_session_summary()
+            summary = self._summary_cache
+        
+        # La duración cambia en cada llamada: no forma parte de la caché
+        return {
+            'session_duration': time.monotonic() - self._session_start_mono,
+            **summary,
+            'models_used': dict(summary['models_used'])
+        }
+    
+    def _build_session_summary(self) -> Dict[str, Any]:
+        """Calcular el resumen de sesión sin la duración (con self._lock tomado)"""
+        avg_time = (self.session_metrics['total_response_time'] / 
+                   max(1, self.session_metrics['commands_executed']))
+        
+        cache_total = self.session_metrics['cache_hits'] + self.session_metrics['cache_misses']
+        hit_rate = (self.session_metrics['cache_hits'] / max(1, cache_total)) * 100
+        
+        return {
+            'commands_executed': self.session_metrics['commands_executed'],
+            'avg_response_time': avg_time,
+            'models_used': dict(self.session_metrics['models_used']),
+            'errors_count': self.session_metrics['errors_count'],
+            'cache_hit_rate': hit_rate
+        }
     
     def save_current_state(self):
         """Guardar estado actual en JSON"""
         try:
+            # El resumen solo tiene tipos JSON nativos (la duración ya es float):
+            # serializar de una vez y escribir con una sola llamada
+            data = json.dumps(self.get_session_summary(), indent=2)
             with open(self.current_metrics_path, 'w') as f:
-                json.dump(self.get_session_summary(), f, indent=2, default=str)
+                f.write(data)
         except Exception:
             pass
 
 
-# Instancia global - singleton
-_metrics_collector = None
-
+# Instancia global - singleton (creada en la primera llamada)
+@functools.cache
 def get_metrics_collector() -> MetricsCollector:
     """Obtener instancia global del collector"""
-    global _metrics_collector
-    if _metrics_collector is None:
-        _metrics_collector = MetricsCollector()
-    return _metrics_collector
\ No newline at end of file
+    return MetricsCollector()
\ No newline at end of file
@@ -33,6 +33,9 @@ class FileSecurityManager:
         '/home/.ssh', '/home/.aws', '/home/.kube', '/.ssh', '/.aws', '/.kube'
     }
     
+    # Lowercased once, for a single str.startswith(tuple) check
+    _FORBIDDEN_PREFIXES = tuple(sorted(p.lower() for p in FORBIDDEN_PATHS))
+    
     # Dangerous file patterns
     DANGEROUS_PATTERNS = {
         # Executable extensions
@@ -42,6 +45,38 @@ class FileSecurityManager:
         '.ps1', '.vbs', '.wsf', '.wsh'
     }
     
+    # Suspicious content patterns, matched against the lowercased content
+    SUSPICIOUS_PATTERNS = (
+        r'rm\s+-rf\s+/',
+        r'sudo\s+rm',
+        r'format\s+c:',
+        r'del\s+/[qsf]',
+        r'exec\s*\(',
+        r'eval\s*\(',
+        r'__import__\s*\(',
+        r'subprocess\s*\.',
+        r'os\.system',
+        r'os\.popen',
+        r'shell=True',
+    )
+    
+    # Secrets/keys (basic patterns), lowercase: also matched against the
+    # lowercased content, which makes them case-insensitive
+    SECRET_PATTERNS = (
+        r'password\s*=\s*["\'][^"\']+["\']',
+        r'api_key\s*=\s*["\'][^"\']+["\']',
+        r'secret\s*=\s*["\'][^"\']+["\']',
+        r'token\s*=\s*["\'][^"\']+["\']',
+        r'-----begin\s+private\s+key-----',
+        r'sk-[a-z0-9]{48}',  # OpenAI API key pattern
+    )
+    
+    # Compiled once. Kept as separate case-sensitive patterns: each one starts
+    # with a literal the regex engine can scan for quickly, which is faster
+    # than a single alternation or re.IGNORECASE
+    _SUSPICIOUS_RES = tuple((p, re.compile(p)) for p in SUSPICIOUS_PATTERNS)
+    _SECRET_RES = tuple(re.compile(p) for p in SECRET_PATTERNS)
+    
     # Maximum file size (in bytes) - 10MB
     MAX_FILE_SIZE = 10 * 1024 * 1024
     
@@ -102,10 +137,9 @@ class FileSecurityManager:
             
             # Check forbidden paths
             resolved_str = str(resolved_path).lower()
-            for forbidden in self.FORBIDDEN_PATHS:
-                if resolved_str.startswith(forbidden.lower()):
-                    self._log_security_event("forbidden_path_access", f"Attempted access to forbidden path: {file_path}")
-                    return False, f"❌ Acceso denegado: Ruta del sistema protegida '{file_path}'"
+            if resolved_str.startswith(self._FORBIDDEN_PREFIXES):
+                self._log_security_event("forbidden_path_access", f"Attempted access to forbidden path: {file_path}")
+                return False, f"❌ Acceso denegado: Ruta del sistema protegida '{file_path}'"
             
             # Check file extension
             extension = path.suffix.lower()
@@ -155,38 +189,15 @@ class FileSecurityManager:
                 return False, f"❌ Archivo demasiado grande: {self._format_size(content_size)} > {self._format_size(self.MAX_FILE_SIZE)}"
             
             # Check for suspicious patterns
-            suspicious_patterns = [
-                r'rm\s+-rf\s+/',
-                r'sudo\s+rm',
-                r'format\s+c:',
-                r'del\s+/[qsf]',
-                r'exec\s*\(',
-                r'eval\s*\(',
-                r'__import__\s*\(',
-                r'subprocess\s*\.',
-                r'os\.system',
-                r'os\.popen',
-                r'shell=True',
-            ]
-            
             content_lower = content.lower()
-            for pattern in suspicious_patterns:
-                if re.search(pattern, content_lower):
+            for pattern, compiled in self._SUSPICIOUS_RES:
+                if compiled.search(content_lower):
                     self._log_security_event("suspicious_content", f"Suspicious pattern '{pattern}' found in {file_path}")
                     return False, f"⚠️ Contenido sospechoso detectado: patrón '{pattern}' no permitido"
             
             # Check for secrets/keys (basic patterns)
-            secret_patterns = [
-                r'password\s*=\s*["\'][^"\']+["\']',
-                r'api_key\s*=\s*["\'][^"\']+["\']',
-                r'secret\s*=\s*["\'][^"\']+["\']',
-                r'token\s*=\s*["\'][^"\']+["\']',
-                r'-----BEGIN\s+PRIVATE\s+KEY-----',
-                r'sk-[a-zA-Z0-9]{48}',  # OpenAI API key pattern
-            ]
-            
-            for pattern in secret_patterns:
-                if re.search(pattern, content, re.IGNORECASE):
+            for compiled in self._SECRET_RES:
+                if compiled.search(content_lower):
                     self._log_security_event("potential_secret", f"Potential secret detected in {file_path}")
                     return False, f"🔐 Posible secreto detectado: no incluyas claves o passwords en el código"
             
@@ -9,12 +9,18 @@ import shutil
 from pathlib import Path
 import os
 import sys
+from types import SimpleNamespace
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from config.settings import Settings
 from core.cli_engine import CLIEngine
+from ui.interface import UserInterface
+from context.memory_store import MemoryStore
+from core.command_processor import CommandProcessor
+from security.file_security import FileSecurityManager
+from monitoring.metrics import MetricsCollector, get_metrics_collector
 
 
 @pytest.fixture
@@ -32,6 +38,8 @@ def test_settings(temp_workspace):
     """Create test settings with temporary workspace"""
     settings = Settings()
     settings.workspace_dir = temp_workspace
+    # Databases and caches go to the temporary workspace, not the repo's data/
+    settings.files = {name: Path(temp_workspace) / path.name for name, path in settings.files.items()}
     return settings
 
 
@@ -82,6 +90,55 @@ def sample_project_structure(temp_workspace):
     return project_path
 
 
+@pytest.fixture
+def plain_ui(test_settings):
+    """Create a user interface without colors, so output can be compared literally"""
+    test_settings.cli['colors'] = False
+    return UserInterface(test_settings)
+
+
+@pytest.fixture
+def memory_store(temp_workspace):
+    """Create a MemoryStore backed by a temporary database"""
+    settings = SimpleNamespace(files={'memory_db': Path(temp_workspace) / 'memory.db'})
+    return MemoryStore(settings)
+
+
+@pytest.fixture
+def command_processor(test_settings):
+    """Create a CommandProcessor with no registered commands"""
+    return CommandProcessor(test_settings)
+
+
+@pytest.fixture
+def security_manager(temp_workspace):
+    """Create a FileSecurityManager whose workspace is a subdirectory of the temp dir"""
+    workspace = Path(temp_workspace) / 'workspace'
+    workspace.mkdir()
+    return FileSecurityManager(str(workspace), str(Path(temp_workspace) / 'data'))
+
+
+@pytest.fixture
+def metrics_collector(temp_workspace):
+    """Create a MetricsCollector on a temporary directory, closed on teardown"""
+    collector = MetricsCollector(data_dir=temp_workspace)
+    yield collector
+    collector.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_cwd(tmp_path_factory):
+    """Run the suite from a temporary directory so the global metrics collector stays out of data/"""
+    previous_cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("cwd"))
+    get_metrics_collector.cache_clear()
+    yield
+    if get_metrics_collector.cache_info().currsize:
+        get_metrics_collector().close()
+    get_metrics_collector.cache_clear()
+    os.chdir(previous_cwd)
+
+
 # Test configuration
 def pytest_configure(config):
     """Configure pytest"""
@@ -0,0 +1,77 @@
+"""
+Tests del procesador de comandos especiales
+"""
+
+from core.command_processor import safe
+
+
+class TestCommandDispatch:
+    """Tests del despacho de comandos"""
+
+    def test_dispatch_passes_arguments(self, command_processor):
+        """El handler recibe los argumentos ya separados"""
+        command_processor.register_command('echo', lambda args: ' '.join(args))
+
+        assert command_processor.process_command('/echo a b  c') == 'a b c'
+
+    def test_unknown_and_empty_commands(self, command_processor):
+        """Comando desconocido, prefijo solo y texto sin prefijo"""
+        command_processor.register_command('ls', lambda args: '')
+
+        assert command_processor.process_command('/nope').startswith('❌ Comando desconocido')
+        assert '/ls' in command_processor.process_command('/')
+        assert command_processor.process_command('ls') is None
+
+    def test_uppercase_command_falls_back_to_lowercase(self, command_processor):
+        """Un comando escrito en mayúsculas encuentra el handler en minúsculas"""
+        command_processor.register_command('ls', lambda args: 'listado')
+
+        assert command_processor.process_command('/ls') == 'listado'
+        assert command_processor.process_command('/LS') == 'listado'
+
+    def test_fast_commands(self, command_processor):
+        """is_fast reconoce los comandos rápidos sin distinguir mayúsculas"""
+        command_processor.register_command('help', lambda args: '', fast=True)
+        command_processor.register_command('analyze', lambda args: '')
+
+        assert command_processor.is_fast('help')
+        assert command_processor.is_fast('HELP')
+        assert not command_processor.is_fast('analyze')
+
+    def test_unsafe_handler_errors_are_reported(self, command_processor):
+        """Un handler normal que lanza devuelve un mensaje de error"""
+        def broken(args):
+            raise OSError('disco lleno')
+
+        command_processor.register_command('save', broken)
+
+        result = command_processor.process_command('/save')
+        assert result.startswith('❌ Error ejecutando comando')
+        assert 'disco lleno' in result
+
+    def test_safe_handler_is_called_directly(self, command_processor):
+        """Un handler marcado con @safe se llama sin envolver en try/except"""
+        calls = []
+
+        @safe
+        def help_handler(args):
+            calls.append(args)
+            return 'ayuda'
+
+        command_processor.register_command('help', help_handler)
+
+        assert command_processor.process_command('/help x') == 'ayuda'
+        assert calls == [['x']]
+        assert 'help' in command_processor._safe_commands
+
+    def test_reregistering_drops_safe_flag(self, command_processor):
+        """Registrar un handler normal con el mismo nombre quita el camino directo"""
+        command_processor.register_command('help', safe(lambda args: 'ayuda'))
+
+        def broken(args):
+            raise ValueError('roto')
+
+        command_processor.register_command('help', broken)
+
+        assert 'help' not in command_processor._safe_commands
+        assert command_processor.process_command('/help').startswith('❌ Error ejecutando comando')
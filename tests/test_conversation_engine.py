@@ -0,0 +1,101 @@
+"""
+Tests de la persistencia del motor conversacional
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from core.conversation_engine import ConversationEngine
+from core.nlp_parser import IntentType, ParsedIntent
+
+
+@pytest.fixture
+def engine():
+    """Motor con una conversación de tres turnos"""
+    engine = ConversationEngine(max_context_turns=5)
+    engine.start_conversation('conv_test')
+    engine.add_turn('analiza main.py',
+                    ParsedIntent(IntentType.ANALYZE, 0.9, 'main.py', {'depth': 'full'}, 'analiza main.py'),
+                    'Análisis ñ 👍', 1.5)
+    engine.add_turn('optimiza main.py', ParsedIntent(IntentType.OPTIMIZE, 0.8, 'main.py'), 'Hecho', 2.0)
+    engine.add_turn('crea test.py', ParsedIntent(IntentType.CREATE, 0.7, 'test.py'), 'Error', 0.5, success=False)
+    return engine
+
+
+@pytest.fixture
+def context_file(temp_workspace):
+    """Ruta del archivo de contexto en el workspace temporal"""
+    return str(Path(temp_workspace) / 'context.json')
+
+
+class TestContextPersistence:
+    """Tests de save_context / load_context"""
+
+    def test_round_trip_preserves_history_and_summary(self, engine, context_file):
+        """Guardar y cargar reproduce el historial, el contexto y el resumen"""
+        engine.save_context(context_file)
+
+        loaded = ConversationEngine(max_context_turns=5)
+        loaded.load_context(context_file)
+
+        assert [turn.user_input for turn in loaded.conversation_history] == \
+            ['analiza main.py', 'optimiza main.py', 'crea test.py']
+        first = loaded.conversation_history[0]
+        assert first.parsed_intent.intent is IntentType.ANALYZE
+        assert first.parsed_intent.action_details == {'depth': 'full'}
+        assert first.response == 'Análisis ñ 👍'
+        assert first.timestamp == engine.conversation_history[0].timestamp
+        assert loaded.conversation_history[2].success is False
+
+        assert loaded.current_context.session_id == 'conv_test'
+        assert loaded.current_context.intent_counts == engine.current_context.intent_counts
+        assert loaded.current_context.target_counts == engine.current_context.target_counts
+        assert list(loaded.current_context.recent_actions) == list(engine.current_context.recent_actions)
+
+        expected = engine.get_session_summary()
+        summary = loaded.get_session_summary()
+        for key in ('total_turns', 'successful_turns', 'failed_turns', 'avg_execution_time', 'user_patterns'):
+            assert summary[key] == expected[key]
+
+    def test_load_accepts_old_and_invalid_intents(self, engine, context_file):
+        """Los intents "IntentType.X" se reconocen y los que no son texto pasan a UNKNOWN"""
+        engine.save_context(context_file)
+
+        with open(context_file, encoding='utf-8') as f:
+            data = json.load(f)
+        data['conversation_history'][0]['parsed_intent']['intent'] = 'IntentType.EXPLAIN'
+        data['conversation_history'][1]['parsed_intent']['intent'] = None
+        with open(context_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+        loaded = ConversationEngine(max_context_turns=5)
+        loaded.load_context(context_file)
+
+        intents = [turn.parsed_intent.intent for turn in loaded.conversation_history]
+        assert intents == [IntentType.EXPLAIN, IntentType.UNKNOWN, IntentType.CREATE]
+
+    def test_saved_file_is_one_json_document(self, engine, context_file):
+        """El archivo escrito por partes es un único JSON válido, también sin turnos"""
+        engine.save_context(context_file)
+        with open(context_file, encoding='utf-8') as f:
+            data = json.load(f)
+        assert len(data['conversation_history']) == 3
+        assert data['session_start'] == engine.session_start
+
+        engine.start_conversation('vacia')
+        engine.save_context(context_file)
+        with open(context_file, encoding='utf-8') as f:
+            assert json.load(f)['conversation_history'] == []
+
+    def test_truncated_file_starts_clean_conversation(self, context_file):
+        """Un archivo cortado a medias (escritura interrumpida) deja un contexto nuevo"""
+        with open(context_file, 'w', encoding='utf-8') as f:
+            f.write('{"context":{"session_id":"x"},"conversation_history":[')
+
+        loaded = ConversationEngine()
+        loaded.load_context(context_file)
+
+        assert loaded.current_context is not None
+        assert len(loaded.conversation_history) == 0
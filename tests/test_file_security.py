@@ -0,0 +1,45 @@
+"""
+Tests de la validación de rutas del gestor de seguridad
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+
+
+class TestPathValidation:
+    """Tests de validate_file_path"""
+
+    def test_valid_and_invalid_paths(self, security_manager):
+        """Rutas dentro del workspace, vacías, fuera de él, con extensión peligrosa o sensibles"""
+        assert security_manager.validate_file_path('src/main.py') == (True, "")
+        assert security_manager.validate_file_path('')[0] is False
+        assert security_manager.validate_file_path('../fuera.py')[0] is False
+        assert security_manager.validate_file_path('script.exe')[0] is False
+        assert security_manager.validate_file_path('passwd.txt')[0] is False
+
+    def test_repeated_rejections_are_logged_every_time(self, security_manager):
+        """Cada intento rechazado queda en security.log, aunque se repita la ruta"""
+        for _ in range(3):
+            assert security_manager.validate_file_path('../fuera.py')[0] is False
+
+        log = security_manager.security_log_path.read_text(encoding='utf-8')
+        assert log.count('PATH_TRAVERSAL_ATTEMPT') == 3
+
+    @pytest.mark.skipif(not hasattr(os, 'symlink'), reason="requiere enlaces simbólicos")
+    def test_symlink_retargeted_after_validation(self, security_manager, temp_workspace):
+        """resolve() se repite en cada llamada: un enlace redirigido fuera se rechaza"""
+        inside = security_manager.workspace_dir / 'real'
+        inside.mkdir()
+        outside = Path(temp_workspace) / 'outside'
+        outside.mkdir()
+        link = security_manager.workspace_dir / 'link'
+        link.symlink_to(inside, target_is_directory=True)
+
+        assert security_manager.validate_file_path('link/notas.md')[0] is True
+
+        link.unlink()
+        link.symlink_to(outside, target_is_directory=True)
+
+        assert security_manager.validate_file_path('link/notas.md')[0] is False
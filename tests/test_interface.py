@@ -0,0 +1,41 @@
+"""
+Tests de la salida incremental de la interfaz de usuario
+"""
+
+
+class TestStreamOutput:
+    """Tests de begin_stream / write_token / end_stream"""
+
+    def test_stream_prints_prefix_once_and_closes_line(self, plain_ui, capsys):
+        """El prefijo sale con el primer fragmento y end_stream termina la línea"""
+        prefix = plain_ui.settings.cli['response_prefix']
+
+        plain_ui.begin_stream()
+        plain_ui.write_token('Hola')
+        plain_ui.write_token(' mundo')
+        streamed = plain_ui.end_stream()
+
+        assert streamed is True
+        assert capsys.readouterr().out == f"{prefix}Hola mundo\n\n"
+
+    def test_multiline_tokens_keep_indentation(self, plain_ui, capsys):
+        """Las líneas nuevas se indentan al ancho del prefijo, como show_response"""
+        prefix = plain_ui.settings.cli['response_prefix']
+
+        plain_ui.begin_stream()
+        plain_ui.write_token('uno\ndos')
+        plain_ui.end_stream()
+
+        assert capsys.readouterr().out == f"{prefix}uno\n{' ' * len(prefix)}dos\n\n"
+
+    def test_empty_stream_prints_nothing(self, plain_ui, capsys):
+        """Sin fragmentos, end_stream devuelve False y no escribe nada"""
+        plain_ui.begin_stream()
+        assert plain_ui.end_stream() is False
+        assert capsys.readouterr().out == ''
+
+        # El estado se reinicia: un nuevo stream vuelve a mostrar el prefijo
+        plain_ui.begin_stream()
+        plain_ui.write_token('x')
+        plain_ui.end_stream()
+        assert capsys.readouterr().out.startswith(plain_ui.settings.cli['response_prefix'])
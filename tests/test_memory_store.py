@@ -0,0 +1,36 @@
+"""
+Tests del almacén de memoria persistente
+"""
+
+
+class TestCommandUsage:
+    """Tests del registro de uso de comandos"""
+
+    def test_async_record_matches_sync_record(self, memory_store):
+        """Los registros encolados terminan igual que los síncronos tras flush"""
+        for i in range(100):
+            memory_store.async_record_command_usage('ls' if i % 2 else 'cat', 'session')
+        memory_store.record_command_usage('tree', 'session')
+        memory_store.flush_command_usage()
+
+        counts = {c['command']: c['usage_count'] for c in memory_store.get_popular_commands()}
+        assert counts == {'ls': 50, 'cat': 50, 'tree': 1}
+
+    def test_flush_without_pending_records(self, memory_store):
+        """flush no bloquea si nunca se encoló nada"""
+        memory_store.flush_command_usage()
+        assert memory_store.get_popular_commands() == []
+
+
+class TestMessageSearch:
+    """Tests de la búsqueda en mensajes archivados"""
+
+    def test_search_is_literal_and_scoped_to_session(self, memory_store):
+        """Los comodines de LIKE se buscan como texto y se respeta la sesión"""
+        memory_store.save_message('a', 'user', 'progreso al 100%')
+        memory_store.save_message('a', 'user', 'progreso al 1000')
+        memory_store.save_message('b', 'user', 'otra sesión al 100%')
+
+        results = memory_store.search_messages('100%', session_id='a')
+        assert [r['content'] for r in results] == ['progreso al 100%']
+        assert len(memory_store.search_messages('100%')) == 2
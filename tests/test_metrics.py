@@ -0,0 +1,52 @@
+"""
+Tests del recolector de métricas
+"""
+
+import sqlite3
+from pathlib import Path
+
+
+class TestMetricsPersistence:
+    """Tests de la escritura de métricas en la base de datos"""
+
+    def test_flush_persists_queued_metrics(self, metrics_collector, temp_workspace):
+        """Tras flush, todas las métricas encoladas están en la DB"""
+        collector = metrics_collector
+
+        for i in range(250):
+            collector.log_command('ls', 0.01, success=i % 10 != 0)
+        collector.log_cache_hit('llm', True)
+        collector.count_command('help')
+        collector.count_command('help')
+        collector.flush()
+
+        with sqlite3.connect(Path(temp_workspace) / 'metrics.db') as conn:
+            rows = dict(conn.execute(
+                'SELECT metric_name, COUNT(*) FROM metrics GROUP BY metric_name'
+            ).fetchall())
+            help_count = conn.execute(
+                "SELECT value FROM metrics WHERE metric_name = 'command_count'"
+            ).fetchone()[0]
+
+        assert rows == {'command_execution': 250, 'cache_hit': 1, 'command_count': 1}
+        assert help_count == 2
+        assert collector.get_session_summary()['errors_count'] == 25
+
+
+class TestMetricsShutdown:
+    """Tests del cierre del recolector"""
+
+    def test_close_is_idempotent_and_joins_writer(self, metrics_collector, temp_workspace):
+        """close persiste lo pendiente, termina el hilo escritor y se puede repetir"""
+        metrics_collector.log_command('ls', 0.01)
+        metrics_collector.count_command('help')
+
+        metrics_collector.close()
+        metrics_collector.close()
+
+        assert not metrics_collector._writer.is_alive()
+        # Sin escritor, flush no espera
+        assert metrics_collector.flush() is False
+
+        with sqlite3.connect(Path(temp_workspace) / 'metrics.db') as conn:
+            assert conn.execute('SELECT COUNT(*) FROM metrics').fetchone()[0] == 2
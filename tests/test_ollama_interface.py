@@ -0,0 +1,181 @@
+"""
+Tests de la interfaz HTTP con Ollama (contra un servidor falso local)
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import core.ollama_interface as ollama_module
+from config.settings import Settings
+from core.ollama_interface import OllamaInterface
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Imita /api/tags y /api/generate (NDJSON) del servidor de Ollama"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/api/tags':
+            return self._send_json(404, {'error': 'not found'})
+
+        self.server.tag_requests += 1
+        self._send_json(200, {'models': [{'name': name} for name in self.server.models]})
+        # Cerrar la conexión tras responder, sin avisar (como un keep-alive caducado)
+        if self.server.drop_after_response:
+            self.close_connection = True
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.server.requests.append(json.loads(self.rfile.read(length)))
+
+        lines = b''.join(json.dumps(chunk).encode() + b'\n' for chunk in self.server.chunks)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Content-Length', str(len(lines)))
+        self.end_headers()
+        self.wfile.write(lines)
+
+
+@pytest.fixture
+def fake_ollama(monkeypatch):
+    """Servidor falso de Ollama en un puerto libre; OllamaInterface apunta a él"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.models = ['deepseek-r1:latest', 'qwen2.5-coder:7b']
+    server.chunks = [
+        {'response': 'Hola', 'done': False},
+        {'response': ' mundo', 'done': False},
+        {'response': '', 'done': True}
+    ]
+    server.requests = []
+    server.connections = 0
+    server.tag_requests = 0
+    server.drop_after_response = False
+
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    monkeypatch.setattr(ollama_module, 'OLLAMA_HOST', '127.0.0.1')
+    monkeypatch.setattr(ollama_module, 'OLLAMA_PORT', server.server_address[1])
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ollama(fake_ollama):
+    """OllamaInterface conectado al servidor falso"""
+    interface = OllamaInterface(Settings())
+    yield interface
+    interface._close_http()
+
+
+class TestChatStream:
+    """Tests de la lectura de respuestas NDJSON por fragmentos"""
+
+    def test_stream_yields_chunks_in_order(self, ollama, fake_ollama):
+        """Cada línea con texto produce un fragmento; la de done termina"""
+        messages = [{'role': 'user', 'content': 'hola'}]
+
+        assert list(ollama.chat_stream(messages, 'deepseek-r1:latest')) == ['Hola', ' mundo']
+        assert fake_ollama.requests[0]['model'] == 'deepseek-r1:latest'
+        assert fake_ollama.requests[0]['stream'] is True
+
+    def test_chat_forwards_chunks_to_callback(self, ollama):
+        """chat() pasa cada fragmento al callback y devuelve el texto completo"""
+        received = []
+
+        result = ollama.chat([{'role': 'user', 'content': 'hola'}], 'deepseek-r1:latest',
+                             stream_callback=received.append)
+
+        assert received == ['Hola', ' mundo']
+        assert result == 'Hola mundo'
+
+    def test_error_mid_stream_raises_and_drops_connection(self, ollama, fake_ollama):
+        """Un error a mitad del stream se lanza como RuntimeError tras los fragmentos previos"""
+        fake_ollama.chunks = [
+            {'response': 'Hola', 'done': False},
+            {'error': 'model crashed'}
+        ]
+        received = []
+
+        with pytest.raises(RuntimeError, match='model crashed'):
+            for text in ollama.chat_stream([{'role': 'user', 'content': 'hola'}], 'deepseek-r1:latest'):
+                received.append(text)
+
+        assert received == ['Hola']
+        # La respuesta quedó a medias: la conexión no se reutiliza
+        assert ollama._http is None
+
+    def test_chat_returns_none_on_stream_error(self, ollama, fake_ollama):
+        """chat() captura el error de Ollama y devuelve None"""
+        fake_ollama.chunks = [{'error': 'model crashed'}]
+
+        assert ollama.chat([{'role': 'user', 'content': 'hola'}], 'deepseek-r1:latest') is None
+
+
+class TestHTTPConnection:
+    """Tests de la conexión persistente con el API"""
+
+    def test_reuses_connection(self, ollama, fake_ollama):
+        """Peticiones seguidas comparten la misma conexión keep-alive"""
+        assert ollama._get_json('/api/tags') is not None
+        assert ollama._get_json('/api/tags') is not None
+
+        assert fake_ollama.connections == 1
+
+    def test_retries_once_when_server_drops_connection(self, ollama, fake_ollama):
+        """Si el servidor cerró la conexión inactiva, se reintenta con una nueva"""
+        fake_ollama.drop_after_response = True
+
+        assert ollama._get_json('/api/tags') is not None
+        assert ollama._get_json('/api/tags') is not None
+
+        assert fake_ollama.connections == 2
+
+
+class TestModels:
+    """Tests de la lista de modelos y la prueba de conexión"""
+
+    def test_model_list_is_fetched_once(self, ollama, fake_ollama):
+        """test_model y get_available_models comparten una sola consulta a /api/tags"""
+        assert ollama.test_model('deepseek-r1:latest')
+        assert ollama.test_model('deepseek-r1')
+        assert not ollama.test_model('qwen2.5')
+        assert ollama.get_available_models() == fake_ollama.models
+
+        assert fake_ollama.tag_requests == 1
+
+    def test_test_model_accepts_untagged_names(self, ollama):
+        """Un nombre sin etiqueta coincide con el modelo instalado de ese nombre"""
+        assert ollama.test_model('qwen2.5-coder')
+        assert not ollama.test_model('qwen2.5')
+
+    def test_unreachable_api_reports_no_connection(self, monkeypatch):
+        """Sin API HTTP no hay conexión ni modelos, igual que para chat()"""
+        monkeypatch.setattr(ollama_module, 'OLLAMA_HOST', '127.0.0.1')
+        monkeypatch.setattr(ollama_module, 'OLLAMA_PORT', 1)
+        interface = OllamaInterface(Settings())
+
+        assert interface.test_connection() is False
+        assert interface.get_available_models() == []
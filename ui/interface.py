@@ -3,7 +3,8 @@ Interfaz de usuario para la CLI
 """
 
 import sys
-from typing import Optional
+import time
+from typing import Optional, Callable, Union
 
 class UserInterface:
     """Interfaz de usuario de la CLI"""
@@ -11,6 +12,11 @@ class UserInterface:
     def __init__(self, settings):
         self.settings = settings
         self.colors_enabled = settings.cli['colors']
+        self._stream_tokens = 0
+        self._last_flush = 0.0
+        
+        # Intervalo máximo sin volcar stdout durante el streaming (segundos)
+        self.stream_flush_interval = 0.05
         
         # Códigos de color ANSI
         self.colors = {
@@ -58,6 +64,10 @@ class UserInterface:
 """
         print(welcome_text)
     
+    def flush_before_prompt(self):
+        """Volcar la salida pendiente antes de volver a pedir entrada"""
+        sys.stdout.flush()
+    
     def get_user_input(self) -> str:
         """Obtener entrada del usuario"""
         prompt = self._colorize(self.settings.cli['prompt'], 'green')
@@ -84,13 +94,41 @@ class UserInterface:
                 indent = ' ' * len(self.settings.cli['response_prefix'])
                 formatted_lines.append(f"{indent}{line}")
         
-        print('\n'.join(formatted_lines))
-        print()  # Línea en blanco después de la respuesta
+        # Una sola escritura, con línea en blanco después de la respuesta
+        print('\n'.join(formatted_lines), end='\n\n')
+    
+    def begin_stream(self):
+        """Preparar la salida incremental de una respuesta"""
+        self._stream_tokens = 0
+        self._last_flush = time.monotonic()
+    
+    def write_token(self, token: str):
+        """Mostrar un fragmento de respuesta según llega del modelo"""
+        prefix = self.settings.cli['response_prefix']
+        if not self._stream_tokens:
+            print(self._colorize(prefix, 'blue'), end='')
+        
+        # Mantener la misma indentación que show_response
+        print(token.replace('\n', '\n' + ' ' * len(prefix)), end='')
+        self._stream_tokens += 1
+        
+        # Volcar por líneas o cada stream_flush_interval, no por cada fragmento
+        now = time.monotonic()
+        if '\n' in token or now - self._last_flush >= self.stream_flush_interval:
+            sys.stdout.flush()
+            self._last_flush = now
+    
+    def end_stream(self) -> bool:
+        """Cerrar la salida incremental. Devuelve True si se mostró algún fragmento"""
+        streamed = self._stream_tokens > 0
+        if streamed:
+            print('\n', flush=True)
+        self._stream_tokens = 0
+        return streamed
     
     def show_message(self, message: str):
         """Mostrar mensaje general"""
-        print(self._colorize(message, 'white'))
-        print()
+        print(self._colorize(message, 'white'), end='\n\n')
     
     def show_error(self, error: str):
         """Mostrar mensaje de error"""
@@ -107,10 +145,19 @@ class UserInterface:
         print(self._colorize(f"✅ {success}", 'green'))
         print()
     
-    def show_debug(self, debug: str):
-        """Mostrar mensaje de debug (solo si debug está habilitado)"""
-        if self.settings.cli.get('debug', False):
-            print(self._colorize(f"🐛 {debug}", 'gray'))
+    def show_debug(self, debug: Union[str, Callable[[], str]]):
+        """
+        Mostrar mensaje de debug (solo si debug está habilitado)
+        
+        Acepta también un callable que construye el mensaje, de modo que el
+        formateo solo ocurre cuando el debug está activo.
+        """
+        if not self.settings.cli.get('debug', False):
+            return
+        
+        if callable(debug):
+            debug = debug()
+        print(self._colorize(f"🐛 {debug}", 'gray'))
     
     def show_thinking(self):
         """Mostrar indicador de procesamiento"""
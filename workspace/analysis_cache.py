@@ -4,6 +4,7 @@ Sistema de cache inteligente para análisis de código
 
 import hashlib
 import json
+import shutil
 import time
 from pathlib import Path
 from typing import Dict, Any, Optional, List
@@ -14,6 +15,13 @@ from monitoring.metrics import get_metrics_collector
 class AnalysisCache:
     """Cache inteligente para operaciones de análisis costosas"""
     
+    # Versión de los prompts de análisis: subirla invalida los análisis LLM en disco
+    LLM_CACHE_VERSION = 1
+    
+    # Límites del cache LLM en disco
+    LLM_CACHE_MAX_AGE = 7 * 24 * 3600  # segundos
+    LLM_CACHE_MAX_FILES = 500
+    
     def __init__(self, workspace_dir: str, max_cache_size: int = 100):
         self.workspace_dir = Path(workspace_dir)
         self.max_cache_size = max_cache_size
@@ -32,6 +40,9 @@ class AnalysisCache:
         self.cache_dir = self.workspace_dir / '.local_claude_cache'
         self.cache_dir.mkdir(exist_ok=True)
         
+        # Análisis LLM persistidos por hash de contenido (sobreviven entre sesiones)
+        self.llm_cache_dir = self.cache_dir / 'llm'
+        
     def _get_file_hash(self, file_path: Path) -> str:
         """Obtener hash único del archivo basado en contenido + timestamp"""
         try:
@@ -146,27 +157,86 @@ class AnalysisCache:
         except (SyntaxError, ValueError):
             return None
     
-    def get_llm_analysis(self, content_hash: str, analysis_type: str) -> Optional[str]:
-        """Obtener análisis de LLM con cache"""
-        cache_key = f"{content_hash}:{analysis_type}"
+    def _get_llm_cache_key(self, content_hash: str, analysis_type: str, model: str) -> str:
+        """Clave de un análisis LLM: contenido, tipo, modelo y versión de prompts"""
+        return f"v{self.LLM_CACHE_VERSION}:{model}:{analysis_type}:{content_hash}"
+    
+    def _get_llm_cache_path(self, cache_key: str) -> Path:
+        """Ruta en disco de un análisis LLM cacheado"""
+        return self.llm_cache_dir / f"{hashlib.sha256(cache_key.encode()).hexdigest()}.json"
+    
+    def _prune_llm_cache(self):
+        """Mantener el cache LLM en disco bajo LLM_CACHE_MAX_FILES (borra los más antiguos)"""
+        try:
+            files = [(f.stat().st_mtime, f) for f in self.llm_cache_dir.glob('*.json')]
+        except OSError:
+            return
+        
+        excess = len(files) - self.LLM_CACHE_MAX_FILES
+        if excess <= 0:
+            return
+        
+        for _, cache_file in sorted(files)[:excess]:
+            try:
+                cache_file.unlink()
+            except OSError:
+                pass
+    
+    def get_llm_analysis(self, content_hash: str, analysis_type: str, model: str = '') -> Optional[str]:
+        """Obtener análisis de LLM con cache (memoria y luego disco)"""
+        cache_key = self._get_llm_cache_key(content_hash, analysis_type, model)
         
         # Check cache
         if cache_key in self.analysis_cache:
             self.analysis_cache.move_to_end(cache_key)
+            self.metrics.log_cache_hit('llm_analysis', True)
             return self.analysis_cache[cache_key]['result']
         
-        return None
-    
-    def cache_llm_analysis(self, content_hash: str, analysis_type: str, result: str):
-        """Cachear resultado de análisis LLM"""
-        cache_key = f"{content_hash}:{analysis_type}"
+        # Check disk: el mismo contenido ya analizado en otra sesión
+        cache_path = self._get_llm_cache_path(cache_key)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.metrics.log_cache_hit('llm_analysis', False)
+            return None
+        
+        # Entrada caducada: se descarta
+        if time.time() - entry.get('timestamp', 0) > self.LLM_CACHE_MAX_AGE:
+            try:
+                cache_path.unlink()
+            except OSError:
+                pass
+            self.metrics.log_cache_hit('llm_analysis', False)
+            return None
         
         self._maintain_cache_size(self.analysis_cache)
-        self.analysis_cache[cache_key] = {
+        self.analysis_cache[cache_key] = entry
+        self.metrics.log_cache_hit('llm_analysis', True)
+        return entry['result']
+    
+    def cache_llm_analysis(self, content_hash: str, analysis_type: str, result: str, model: str = ''):
+        """Cachear resultado de análisis LLM en memoria y en disco"""
+        cache_key = self._get_llm_cache_key(content_hash, analysis_type, model)
+        entry = {
             'result': result,
             'timestamp': time.time(),
-            'analysis_type': analysis_type
+            'analysis_type': analysis_type,
+            'model': model
         }
+        
+        self._maintain_cache_size(self.analysis_cache)
+        self.analysis_cache[cache_key] = entry
+        
+        try:
+            self.llm_cache_dir.mkdir(exist_ok=True)
+            with open(self._get_llm_cache_path(cache_key), 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+        except OSError:
+            # Fallo silencioso: el cache en memoria sigue siendo válido
+            return
+        
+        self._prune_llm_cache()
     
     def get_project_structure(self, max_age_seconds: int = 300) -> Optional[Dict[str, Any]]:
         """Obtener estructura del proyecto con cache (5 min default)"""
@@ -253,4 +323,7 @@ class AnalysisCache:
         self.ast_cache.clear()
         self.analysis_cache.clear()
         self.project_structure_cache = None
-        self.project_structure_timestamp = 0
\ No newline at end of file
+        self.project_structure_timestamp = 0
+        
+        # Eliminar análisis LLM persistidos
+        shutil.rmtree(self.llm_cache_dir, ignore_errors=True)
\ No newline at end of file
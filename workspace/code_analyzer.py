@@ -75,8 +75,8 @@ class CodeAnalyzer:
                 return f"❌ '{file_path}' parece ser un archivo binario o inaccesible"
             
             # 🚀 OPTIMIZACIÓN: Verificar cache de análisis LLM
-            content_hash = hashlib.md5(content.encode()).hexdigest()
-            cached_analysis = self.cache.get_llm_analysis(content_hash, 'file_analysis')
+            content_hash = hashlib.sha256(content.encode()).hexdigest()
+            cached_analysis = self.cache.get_llm_analysis(content_hash, 'file_analysis', self.settings.models['primary'])
             
             if cached_analysis:
                 return f"📋 Análisis de {file_path} (cached):\n\n{cached_analysis}"
@@ -86,7 +86,7 @@ class CodeAnalyzer:
             analysis = self._analyze_by_type(content, file_path, file_type)
             
             # 🚀 OPTIMIZACIÓN: Cachear resultado del análisis
-            self.cache.cache_llm_analysis(content_hash, 'file_analysis', analysis)
+            self.cache.cache_llm_analysis(content_hash, 'file_analysis', analysis, self.settings.models['primary'])
             
             return analysis
             
@@ -172,8 +172,9 @@ class CodeAnalyzer:
                 return f"❌ El archivo '{file_path}' no existe"
             
             # Leer y analizar archivo
-            with open(target_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = self.cache.get_file_content(target_path)
+            if content is None:
+                return f"❌ '{file_path}' parece ser un archivo binario o inaccesible"
             
             # Generar sugerencias con LLM
             suggestions = self._generate_suggestions(content, file_path)
@@ -566,8 +567,14 @@ Responde de forma concisa y práctica."""
         return issues
     
     def _generate_suggestions(self, content: str, file_path: str) -> str:
-        """Generar sugerencias usando LLM"""
+        """Generar sugerencias usando LLM (cacheadas por contenido)"""
         try:
+            content_hash = hashlib.sha256(content.encode()).hexdigest()
+            suggestions = self.cache.get_llm_analysis(content_hash, 'suggestions', self.settings.models['primary'])
+            
+            if suggestions:
+                return f"💡 **Sugerencias para '{file_path}':**\n\n{suggestions}"
+            
             prompt = f"""Analiza este código y proporciona sugerencias de mejora específicas:
 
 ARCHIVO: {file_path}
@@ -590,6 +597,7 @@ Responde de forma concisa y práctica."""
             suggestions = self.ollama_interface.chat(messages, self.settings.models['primary'])
             
             if suggestions:
+                self.cache.cache_llm_analysis(content_hash, 'suggestions', suggestions, self.settings.models['primary'])
                 return f"💡 **Sugerencias para '{file_path}':**\n\n{suggestions}"
             else:
                 return f"💡 No se pudieron generar sugerencias para '{file_path}'"